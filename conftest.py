@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def inline_uploads(settings):
+    """Картинки обрабатываются сразу после коммита, а не в потоках.
+
+    Поток с миниатюрами не должен пережить временный MEDIA_ROOT теста.
+    """
+    settings.THUMBNAIL_WORKERS = 0
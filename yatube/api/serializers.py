@@ -0,0 +1,56 @@
+from posts.storage import post_image_storage
+
+
+def image_url(name):
+    return post_image_storage.url(name) if name else None
+
+
+# Поле ответа -> (поле для values(), преобразование значения)
+POST_FIELDS = {
+    "id": ("id", None),
+    "text": ("text", None),
+    "pub_date": ("pub_date", None),
+    "author": ("author__username", None),
+    "group": ("group__slug", None),
+    "image": ("image", image_url),
+    "image_width": ("image_width", None),
+    "image_height": ("image_height", None),
+    "comments_count": ("comments_count", None),
+}
+COMMENT_FIELDS = {
+    "id": ("id", None),
+    "post": ("post_id", None),
+    "author": ("author__username", None),
+    "text": ("text", None),
+    "created": ("created", None),
+}
+
+
+def parse_fields(fields, requested=None):
+    """Имена полей из параметра fields=a,b; без параметра — все.
+
+    На неизвестное поле бросает ValueError с его именем.
+    """
+    if not requested:
+        return list(fields)
+    names = list(dict.fromkeys(name for name in requested.split(",") if name))
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ValueError(", ".join(unknown))
+    return names
+
+
+def lookups(fields, names, key=()):
+    """Поля для values(): запрошенные и поля ключа курсора."""
+    result = [fields[name][0] for name in names]
+    return result + [name for name in key if name not in result]
+
+
+def serialize(fields, names, row):
+    """Словарь ответа из строки values() без создания модели."""
+    data = {}
+    for name in names:
+        lookup, convert = fields[name]
+        value = row[lookup]
+        data[name] = convert(value) if convert else value
+    return data
@@ -0,0 +1,157 @@
+import csv
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+POSTS = reverse("api:posts")
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f"Пост {i}"
+            )
+            for i in range(5)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, response):
+        return [post["id"] for post in response.json()["results"]]
+
+    def test_feeds_mirror_pages(self):
+        newest_first = [post.id for post in reversed(self.posts)]
+        urls = (
+            POSTS,
+            reverse("api:group_posts", args=[self.group.slug]),
+            reverse("api:profile_posts", args=[self.author.username]),
+            reverse("api:follow_posts"),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(self.ids(response), newest_first)
+
+    def test_cursor_pages(self):
+        first = self.client.get(POSTS, {"limit": 3}).json()
+        second = self.client.get(
+            POSTS, {"limit": 3, "cursor": first["next"]}
+        ).json()
+        self.assertEqual(len(first["results"]), 3)
+        self.assertEqual(len(second["results"]), 2)
+        self.assertIsNone(second["next"])
+        back = self.client.get(
+            POSTS, {"limit": 3, "cursor": second["previous"]}
+        ).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_sparse_fields(self):
+        response = self.client.get(POSTS, {"fields": "text,author"})
+        self.assertEqual(
+            response.json()["results"][0],
+            {"text": "Пост 4", "author": "author"},
+        )
+        response = self.client.get(POSTS, {"fields": "text,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_by_ids(self):
+        wanted = [self.posts[2].id, 0, self.posts[0].id]
+        response = self.client.get(
+            POSTS, {"ids": ",".join(map(str, wanted)), "fields": "id"}
+        )
+        self.assertEqual(
+            self.ids(response), [self.posts[2].id, self.posts[0].id]
+        )
+        response = self.client.get(POSTS, {"ids": "1,x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_and_comments(self):
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text="Ответ")
+        response = self.client.get(reverse("api:post_detail", args=[post.id]))
+        self.assertEqual(response.json()["comments_count"], 1)
+        self.assertIsNone(response.json()["image"])
+        response = self.client.get(
+            reverse("api:post_comments", args=[post.id])
+        )
+        self.assertEqual(
+            [comment["text"] for comment in response.json()["results"]],
+            ["Ответ"],
+        )
+        response = self.client.get(reverse("api:post_detail", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_page_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(POSTS)
+        self.assertEqual(len(queries), 1)
+
+    def test_etags(self):
+        for url in (POSTS, reverse("api:follow_posts")):
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)["ETag"]
+                response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Post.objects.create(author=self.author, text="Новый")
+                response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_needs_login(self):
+        response = self.client.get(reverse("api:follow_posts"))
+        self.assertEqual(response.status_code, 401)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.admin = User.objects.create_user(username="admin", is_staff=True)
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f"Пост {i}") for i in range(5)
+        )
+
+    def test_command_walks_table_in_windows(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("export_data", "posts", chunk_size=2, stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [row["text"] for row in rows], [f"Пост {i}" for i in range(5)]
+        )
+        # три окна по id и пустое окно в конце
+        self.assertEqual(len(queries), 4)
+
+    def test_endpoint_streams_csv_for_staff(self):
+        url = reverse("api:export", args=["posts", "csv"])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(url)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:4], ["id", "author_id", "group_id", "text"])
+        self.assertEqual(len(rows), 6)
+        missing = reverse("api:export", args=["users", "csv"])
+        self.assertEqual(client.get(missing).status_code, 404)
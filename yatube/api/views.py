@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.views.decorators.http import require_safe
+
+from posts.caching import post_detail_scopes, versioned_cache_page
+from posts.export import EXPORT_FORMATS, EXPORTS, export_chunks
+from posts.feeds import follow_feed, timeline_follow_posts
+from posts.models import Comment, Group, Post, User
+from posts.utils import KeysetPaginator
+
+from .serializers import (
+    COMMENT_FIELDS,
+    POST_FIELDS,
+    lookups,
+    parse_fields,
+    serialize,
+)
+
+POST_KEY = ("pub_date", "id")
+COMMENT_KEY = ("created", "id")
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={"ensure_ascii": False}
+    )
+
+
+def error(status, detail):
+    return json_response({"detail": detail}, status)
+
+
+def not_found():
+    return error(404, "Не найдено.")
+
+
+def page_size(request, default):
+    try:
+        size = int(request.GET.get("limit", default))
+    except ValueError:
+        size = default
+    return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+
+def requested_fields(request, fields):
+    """Поля из ?fields= или None, если среди них есть неизвестные."""
+    try:
+        return parse_fields(fields, request.GET.get("fields"))
+    except ValueError:
+        return None
+
+
+def list_response(request, queryset, fields, key, default_size):
+    """Страница строк values() по курсору из ?cursor=."""
+    names = requested_fields(request, fields)
+    if names is None:
+        return error(400, "Неизвестное поле в fields.")
+    rows = queryset.values(*lookups(fields, names, key))
+    page = KeysetPaginator(
+        rows, page_size(request, default_size), key=key
+    ).get_page(request.GET.get("cursor"))
+    return json_response(
+        {
+            "results": [serialize(fields, names, row) for row in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        }
+    )
+
+
+def post_list(request, queryset):
+    return list_response(
+        request, queryset, POST_FIELDS, POST_KEY, settings.POSTS_ON_PAGE
+    )
+
+
+def post_batch(request):
+    """Посты по списку ?ids=1,2,3 в порядке списка; ненайденные пропущены."""
+    names = requested_fields(request, POST_FIELDS)
+    if names is None:
+        return error(400, "Неизвестное поле в fields.")
+    try:
+        ids = [int(value) for value in request.GET["ids"].split(",")]
+    except ValueError:
+        return error(400, "ids — список чисел через запятую.")
+    if len(ids) > settings.API_BATCH_SIZE:
+        return error(400, f"Не больше {settings.API_BATCH_SIZE} ids.")
+    rows = {
+        row["id"]: row
+        for row in Post.objects.filter(id__in=ids).values(
+            *lookups(POST_FIELDS, names, ("id",))
+        )
+    }
+    return json_response(
+        {
+            "results": [
+                serialize(POST_FIELDS, names, rows[post_id])
+                for post_id in ids
+                if post_id in rows
+            ]
+        }
+    )
+
+
+# Версии областей кэша те же, что у HTML-страниц: по ним строится ETag,
+# а индекс меняется при любом изменении поста или его комментариев
+@require_safe
+@versioned_cache_page("index")
+def posts(request):
+    if "ids" in request.GET:
+        return post_batch(request)
+    return post_list(request, Post.objects.all())
+
+
+@require_safe
+@versioned_cache_page("group:{slug}")
+def group_posts(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return not_found()
+    return post_list(request, Post.objects.filter(group__slug=slug))
+
+
+@require_safe
+@versioned_cache_page("profile:{username}")
+def profile_posts(request, username):
+    if not User.objects.filter(username=username).exists():
+        return not_found()
+    return post_list(request, Post.objects.filter(author__username=username))
+
+
+@require_safe
+@versioned_cache_page(post_detail_scopes)
+def post_detail(request, post_id):
+    names = requested_fields(request, POST_FIELDS)
+    if names is None:
+        return error(400, "Неизвестное поле в fields.")
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values(*lookups(POST_FIELDS, names))
+        .first()
+    )
+    if row is None:
+        return not_found()
+    return json_response(serialize(POST_FIELDS, names, row))
+
+
+@require_safe
+@versioned_cache_page("post:{post_id}")
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return not_found()
+    return list_response(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        COMMENT_KEY,
+        settings.COMMENTS_ON_PAGE,
+    )
+
+
+@require_safe
+def follow_posts(request):
+    """Лента подписок; у нее нет общей версии, ETag считается по ответу."""
+    if not request.user.is_authenticated:
+        return error(401, "Нужна авторизация.")
+    feed = follow_feed(request.user)
+    if not isinstance(feed, QuerySet):
+        # Лента слиянием — не QuerySet, а values() нужен запрос
+        feed = timeline_follow_posts(request.user)
+    response = post_list(request, feed)
+    set_response_etag(response)
+    return get_conditional_response(
+        request, etag=response["ETag"], response=response
+    )
+
+
+@require_safe
+def export(request, dataset, fmt):
+    """Полная выгрузка набора потоком: первые строки уходят сразу."""
+    if not request.user.is_staff:
+        return error(403, "Выгрузка доступна только администраторам.")
+    if dataset not in EXPORTS or fmt not in EXPORT_FORMATS:
+        return not_found()
+    response = StreamingHttpResponse(
+        export_chunks(dataset, fmt), content_type=EXPORT_FORMATS[fmt]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
+from .feeds import feed_posts
 from .models import Group, Post, Comment, Follow
+from .search import filter_matching, fts_enabled
 
 
 @admin.register(Post)
@@ -17,6 +19,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_queryset(self, request):
+        return feed_posts(super().get_queryset(request), project=False)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идет через индекс FTS5, а не LIKE '%...%'
+        if not search_term.strip() or not fts_enabled():
+            return super().get_search_results(request, queryset, search_term)
+        return filter_matching(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
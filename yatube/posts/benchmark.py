@@ -0,0 +1,264 @@
+import gc
+import json
+import math
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from yatube.settings import COMMENTS_ON_PAGE, POSTS_ON_PAGE
+
+from .feeds import feed_posts, follow_feed
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .utils import NEXT, KeysetPaginator, encode_cursor
+
+BENCHMARK_VIEWS = (
+    "index",
+    "group_posts",
+    "profile",
+    "post_detail",
+    "follow_index",
+)
+BENCHMARK_REPEAT = 30
+# Допустимый рост времени: 0.5 — на 50% медленнее базовой линии;
+# меньший допуск на общей машине ловит шум, а не регрессии
+BENCHMARK_THRESHOLD = 0.5
+# Разницу меньше этой (мс) считаем шумом, а не регрессией
+BENCHMARK_NOISE_MS = 5
+PERCENTILES = (50, 95, 99)
+TIME_METRICS = tuple(f"p{p}_ms" for p in PERCENTILES) + ("sql_ms",)
+
+Scenario = namedtuple("Scenario", ("name", "url", "user"))
+
+
+def percentile(values, p):
+    """Процентиль по ближайшему рангу; для пустого списка — 0."""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def last_page(count, per_page):
+    return max(math.ceil(count / per_page), 1)
+
+
+def deep_cursor(queryset, count, per_page, key=("pub_date", "id")):
+    """Курсор, открывающий ту же глубину, что и последняя страница."""
+    offset = (last_page(count, per_page) - 1) * per_page - 1
+    if offset < 0:
+        return None
+    ordering = [f"-{name}" for name in key]
+    row = queryset.order_by(*ordering).values(*key)[offset]
+    paginator = KeysetPaginator(queryset, per_page, key=key)
+    return encode_cursor(NEXT, paginator._values(row))
+
+
+def feed_scenarios(name, url, queryset, user=None):
+    """Первая страница ленты и самая глубокая: по номеру и по курсору."""
+    count = queryset.count()
+    scenarios = [
+        Scenario(f"{name}:first", url, user),
+        Scenario(
+            f"{name}:deep",
+            f"{url}?page={last_page(count, POSTS_ON_PAGE)}",
+            user,
+        ),
+    ]
+    cursor = deep_cursor(queryset, count, POSTS_ON_PAGE)
+    if cursor:
+        scenarios.append(
+            Scenario(f"{name}:deep-cursor", f"{url}?cursor={cursor}", user)
+        )
+    return scenarios
+
+
+def scenarios():
+    """Страницы для замера на самых тяжелых объектах набора данных.
+
+    Берутся самая большая группа, самый плодовитый автор, пост с
+    наибольшим числом комментариев и читатель с наибольшим числом
+    подписок.
+    """
+    group = Group.objects.order_by("-posts_count", "pk").first()
+    stats = (
+        AuthorStats.objects.select_related("user")
+        .order_by("-posts_count", "pk")
+        .first()
+    )
+    post = Post.objects.order_by("-comments_count", "pk").first()
+    reader = (
+        AuthorStats.objects.filter(following_count__gt=0)
+        .select_related("user")
+        .order_by("-following_count", "pk")
+        .first()
+    )
+    result = feed_scenarios("index", reverse("posts:index"), feed_posts())
+    if group is not None:
+        result += feed_scenarios(
+            "group_posts",
+            reverse("posts:group_list", args=[group.slug]),
+            feed_posts(group.posts.all()),
+        )
+    if stats is not None:
+        result += feed_scenarios(
+            "profile",
+            reverse("posts:profile", args=[stats.user.username]),
+            feed_posts(stats.user.posts.all()),
+        )
+    if post is not None:
+        result += post_scenarios(post)
+    if reader is not None:
+        feed = follow_feed(reader.user)
+        if hasattr(feed, "filter"):
+            result += feed_scenarios(
+                "follow_index",
+                reverse("posts:follow_index"),
+                feed,
+                reader.user,
+            )
+        else:
+            url = reverse("posts:follow_index")
+            result += [
+                Scenario("follow_index:first", url, reader.user),
+                Scenario(
+                    "follow_index:deep",
+                    f"{url}?page={last_page(feed.count(), POSTS_ON_PAGE)}",
+                    reader.user,
+                ),
+            ]
+    return result
+
+
+def post_scenarios(post):
+    """Страница поста и самая старая пачка его комментариев."""
+    result = [
+        Scenario(
+            "post_detail:first",
+            reverse("posts:post_detail", args=[post.pk]),
+            None,
+        )
+    ]
+    cursor = deep_cursor(
+        Comment.objects.filter(post=post),
+        post.comments_count,
+        COMMENTS_ON_PAGE,
+        key=("created", "id"),
+    )
+    if cursor:
+        url = reverse("posts:post_comments", args=[post.pk])
+        result.append(
+            Scenario(
+                "post_detail:deep-comments", f"{url}?cursor={cursor}", None
+            )
+        )
+    return result
+
+
+def measure(client, url, warm):
+    """Время ответа, число запросов к базе и их суммарное время."""
+    if not warm:
+        cache.clear()
+    # Сборка мусора посреди запроса дает случайные выбросы времени
+    gc.collect()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise ValueError(f"{url}: ответ {response.status_code}")
+    sql = sum(float(query["time"]) for query in queries.captured_queries)
+    return elapsed * 1000, len(queries.captured_queries), sql * 1000
+
+
+def run_scenario(scenario, repeat, warm):
+    """Метрики сценария: процентили времени, запросы и время SQL."""
+    client = Client(HTTP_HOST="localhost")
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    if warm:
+        # Первый запрос наполняет кэш и в замер не входит
+        measure(client, scenario.url, warm)
+    samples = [measure(client, scenario.url, warm) for _ in range(repeat)]
+    times, queries, sql = zip(*samples)
+    result = {f"p{p}_ms": round(percentile(times, p), 2) for p in PERCENTILES}
+    result["queries"] = max(queries)
+    result["sql_ms"] = round(percentile(sql, 50), 2)
+    return result
+
+
+def run_benchmark(repeat=BENCHMARK_REPEAT, views=None, log=None, only=None):
+    """Замеры сценариев с пустым и с наполненным кэшем.
+
+    views ограничивает страницы, only — полные имена замеров.
+    """
+    log = log or (lambda message: None)
+    results = {}
+    for scenario in scenarios():
+        if views and scenario.name.split(":")[0] not in views:
+            continue
+        for mode, warm in (("cold", False), ("warm", True)):
+            name = f"{scenario.name}:{mode}"
+            if only is not None and name not in only:
+                continue
+            results[name] = run_scenario(scenario, repeat, warm)
+            log(f"{name}: {results[name]}")
+    return results
+
+
+def dataset_size():
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (User, Group, Post, Comment, Follow)
+    }
+
+
+def compare(baseline, results, threshold=BENCHMARK_THRESHOLD):
+    """Регрессии относительно базовой линии: имя замера -> описания.
+
+    Число запросов детерминировано и сравнивается точно, времена —
+    с допуском threshold и порогом шума BENCHMARK_NOISE_MS.
+    """
+    regressions = {}
+    for name, current in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        problems = []
+        if current["queries"] > expected["queries"]:
+            problems.append(
+                f"запросов {current['queries']} вместо {expected['queries']}"
+            )
+        for metric in TIME_METRICS:
+            limit = expected[metric] * (1 + threshold)
+            if (
+                current[metric] > limit
+                and current[metric] - expected[metric] > BENCHMARK_NOISE_MS
+            ):
+                problems.append(
+                    f"{metric} {current[metric]} "
+                    f"при базовой {expected[metric]}"
+                )
+        if problems:
+            regressions[name] = problems
+    return regressions
+
+
+def read_baseline(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_baseline(path, results, generated_with=""):
+    data = {
+        "generated_with": generated_with,
+        "dataset": dataset_size(),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write("\n")
@@ -0,0 +1,183 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from .models import Post
+
+VERSION_PREFIX = "page-version:"
+PAGE_PREFIX = "page:"
+VALUE_PREFIX = "value:"
+# Область, от которой зависят все страницы (например, названия групп)
+EVERYTHING = "all"
+
+
+def new_version():
+    # Версия от времени не совпадет с версией, потерянной при вытеснении
+    return time.time_ns()
+
+
+def invalidated_timeout(timeout):
+    """Срок кэша, который сбрасывается сигналами записи.
+
+    LocMemCache у каждого процесса свой: сброс из другого процесса
+    или из команды до него не дойдет, поэтому срок сокращается до
+    LOCAL_CACHE_TIMEOUT.
+    """
+    if isinstance(caches["default"], LocMemCache):
+        return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+    return timeout
+
+
+def get_versions(scopes):
+    """Текущие версии областей; недостающие заводятся на лету."""
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def post_scopes(post):
+    """Области кэша страниц, на которых видна карточка поста."""
+    scopes = ["index", f"post:{post.pk}", f"profile:{post.author.username}"]
+    if post.group_id is not None:
+        scopes.append(f"group:{post.group.slug}")
+    return scopes
+
+
+def post_detail_scopes(post_id):
+    """Страница поста зависит и от счетчиков его автора."""
+    author = (
+        Post.objects.filter(pk=post_id)
+        .values_list("author__username", flat=True)
+        .first()
+    )
+    return [f"post:{post_id}", f"profile:{author}"]
+
+
+def bump_versions(*scopes):
+    """Меняет версии областей: все страницы на них становятся устаревшими."""
+    for scope in scopes:
+        key = VERSION_PREFIX + scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), None)
+
+
+def bump_versions_on_commit(*scopes):
+    """bump_versions сейчас и еще раз после коммита транзакции.
+
+    Первая смена версии нужна запросам внутри той же транзакции. Между
+    ней и коммитом читатель может закэшировать еще старые строки под
+    новой версией — такие страницы сбрасывает вторая смена.
+    """
+    bump_versions(*scopes)
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+def page_hash(request, versions):
+    user_id = request.user.pk if request.user.is_authenticated else 0
+    raw = "|".join(
+        (
+            request.get_full_path(),
+            str(user_id),
+            # Формы страницы подписаны CSRF-токеном этого браузера
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+            if user_id
+            else "",
+            ".".join(map(str, versions)),
+        )
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_key(request, versions):
+    return PAGE_PREFIX + page_hash(request, versions)
+
+
+def page_etag(request, versions):
+    """ETag страницы: тот же хэш, что и в ключе ее кэша."""
+    return quote_etag(page_hash(request, versions))
+
+
+def not_modified(request, etag):
+    """Ответ 304, если у клиента уже есть страница с этим ETag, иначе None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+    return response
+
+
+def scopes_version(scopes):
+    """Версия набора областей одной строкой: для ключей кэша фрагментов."""
+    return ".".join(map(str, get_versions([EVERYTHING, *scopes])))
+
+
+def versioned_value(name, version, build):
+    """Значение build(), закэшированное до смены версии областей.
+
+    В отличие от versioned_cache_page, ключ не зависит от пользователя:
+    кэшировать так можно только то, что видят все одинаково.
+    """
+    key = f"{VALUE_PREFIX}{name}:{version}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, invalidated_timeout(settings.PAGE_CACHE_TIMEOUT))
+    return value
+
+
+def versioned_cache_page(*scopes):
+    """Кэширует страницу до изменения областей, от которых она зависит.
+
+    Область — строка-шаблон по аргументам view («group:{slug}») или
+    функция, которая по тем же аргументам возвращает список областей.
+    Версии областей меняются сигналами записи, поэтому срок жизни кэша
+    может быть долгим, а изменения видны сразу. Из тех же версий
+    строится ETag, и на If-None-Match страница отвечает 304.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            names = [EVERYTHING]
+            for scope in scopes:
+                if callable(scope):
+                    names.extend(scope(**kwargs))
+                else:
+                    names.append(scope.format(**kwargs))
+            versions = get_versions(names)
+            etag = page_etag(request, versions)
+            # Клиент с актуальной копией получает 304 еще до кэша и базы
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            key = page_key(request, versions)
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(
+                        key,
+                        response,
+                        invalidated_timeout(settings.PAGE_CACHE_TIMEOUT),
+                    )
+            if response.status_code == 200:
+                response["ETag"] = etag
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,125 @@
+from django.db import connection
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+from .utils import bulk_insert
+
+MODELS = {
+    model.__name__: model
+    for model in (AuthorStats, Comment, Follow, Group, Post)
+}
+
+BATCH_SIZE = 1000
+
+# Что и по какой таблице считать: поле счетчика, источник, внешний ключ
+AUTHOR_COUNTERS = (
+    ("posts_count", "Post", "author"),
+    ("followers_count", "Follow", "author"),
+    ("following_count", "Follow", "user"),
+    ("comments_count", "Comment", "author"),
+)
+
+
+def bump(model, pk, field, delta):
+    """Сдвигает счетчик одной строки UPDATE-ом, без чтения.
+
+    Уменьшение не уводит счетчик ниже нуля. Возвращает число строк.
+    """
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_author(user_id, field, delta):
+    if user_id is None:
+        return
+    if bump(AuthorStats, user_id, field, delta) or delta < 0:
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    bump(AuthorStats, user_id, field, delta)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        bump(Group, group_id, "posts_count", delta)
+
+
+def recount(queryset, field, source, source_fk, batch_size=BATCH_SIZE):
+    """Пересчитывает field у строк queryset по числу строк в source.
+
+    Строки обходятся окнами по первичному ключу, исправляются только
+    разошедшиеся значения. Возвращает число исправленных строк.
+    """
+    fixed = 0
+    # Ключи окна уходят в один IN: окно не больше предела базы на запрос
+    limit = connection.features.max_query_params
+    if limit:
+        batch_size = min(batch_size, limit)
+    queryset = queryset.order_by("pk").only("pk", field)
+    last_pk = None
+    while True:
+        window = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk
+        )
+        batch = list(window[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1].pk
+        counts = dict(
+            source.objects.filter(
+                **{f"{source_fk}__in": [row.pk for row in batch]}
+            )
+            .order_by()
+            .values_list(source_fk)
+            .annotate(total=Count("pk"))
+        )
+        stale = []
+        for row in batch:
+            total = counts.get(row.pk, 0)
+            if getattr(row, field) != total:
+                setattr(row, field, total)
+                stale.append(row)
+        queryset.model.objects.bulk_update(stale, [field])
+        fixed += len(stale)
+
+
+def create_missing_stats(user_model, stats_model, batch_size=BATCH_SIZE):
+    missing = user_model.objects.filter(stats__isnull=True).values_list(
+        "pk", flat=True
+    )
+    bulk_insert(
+        stats_model,
+        [stats_model(user_id=pk) for pk in missing.iterator()],
+        batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def reconcile(user_model, models=MODELS, batch_size=BATCH_SIZE):
+    """Сверяет все счетчики с данными; models — словарь моделей по имени."""
+    create_missing_stats(user_model, models["AuthorStats"], batch_size)
+    fixed = {}
+    for field, source, source_fk in AUTHOR_COUNTERS:
+        fixed[f"author.{field}"] = recount(
+            models["AuthorStats"].objects.all(),
+            field,
+            models[source],
+            source_fk,
+            batch_size,
+        )
+    fixed["group.posts_count"] = recount(
+        models["Group"].objects.all(),
+        "posts_count",
+        models["Post"],
+        "group",
+        batch_size,
+    )
+    fixed["post.comments_count"] = recount(
+        models["Post"].objects.all(),
+        "comments_count",
+        models["Comment"],
+        "post",
+        batch_size,
+    )
+    return fixed
@@ -0,0 +1,244 @@
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+from math import gcd
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+from PIL import Image, ImageDraw
+
+from .images import image_metadata
+from .importer import keep_dates
+from .models import Comment, Follow, Group, Post, User
+from .storage import post_image_storage
+from .utils import bulk_insert
+
+DATASET_BATCH_SIZE = 1000
+# Строк в одной транзакции
+DATASET_CHUNK_SIZE = 20000
+# Большое простое число: умножение на него по модулю перемешивает ранги
+SCATTER_PRIME = 1_000_003
+# Сколько готовых фраз Faker комбинируется в тексты
+PHRASE_POOL = 2000
+# Момент, к которому по умолчанию привязаны даты: от seed и этой даты
+# набор зависит целиком, от дня запуска — нет
+DATASET_NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def skewed_index(rng, count, skew):
+    """Случайный индекс 0..count-1 со степенным перекосом к малым.
+
+    skew = 1 — равномерно; чем больше skew, тем сильнее выделяются
+    первые индексы: несколько «звезд» и длинный хвост.
+    """
+    return min(int(count * rng.random() ** skew), count - 1)
+
+
+def scatter(index, count):
+    """Перестановка индексов, чтобы «звезды» не шли подряд по id."""
+    if gcd(SCATTER_PRIME, count) != 1:
+        return index
+    return index * SCATTER_PRIME % count
+
+
+def chunks(count, size):
+    for start in range(0, count, size):
+        yield start, min(start + size, count)
+
+
+class DatasetGenerator:
+    """Воспроизводимый по seed набор данных для нагрузочных проверок.
+
+    Авторы, группы и посты для комментариев выбираются со степенным
+    перекосом, комментарии приходят всплесками после публикации. Строки
+    пишутся bulk_create с id от 1, поэтому связи не требуют чтения
+    вставленного обратно, а id и имена не зависят от строк в базе.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        batch_size=DATASET_BATCH_SIZE,
+        log=None,
+        now=DATASET_NOW,
+    ):
+        self.rng = random.Random(seed)
+        self.fake = Faker("ru_RU")
+        self.fake.seed_instance(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.now = now
+
+    def check_free(self, model, count):
+        """Проверяет, что id 1..count, которые займет набор, свободны."""
+        if count and model.objects.filter(pk__lte=count).exists():
+            raise ValueError(
+                f"{model.__name__}: id от 1 до {count} уже заняты; "
+                "набор создается в пустой базе"
+            )
+
+    def insert(self, model, count, build, **options):
+        """Вставляет count строк порциями; build(start, stop) — объекты."""
+        for start, stop in chunks(count, DATASET_CHUNK_SIZE):
+            with transaction.atomic():
+                bulk_insert(
+                    model, build(start, stop), self.batch_size, **options
+                )
+            self.log(f"{model._meta.verbose_name_plural}: {stop} из {count}")
+
+    def phrases(self):
+        return [self.fake.sentence(nb_words=10) for _ in range(PHRASE_POOL)]
+
+    def text(self, phrases, sentences):
+        return " ".join(
+            phrases[self.rng.randrange(len(phrases))] for _ in range(sentences)
+        )
+
+    def users(self, count, password):
+        # Пароль хэшируется один раз: это самая дорогая часть строки
+        password = make_password(password)
+        names = [self.fake.user_name() for _ in range(min(count, 5000))]
+
+        def build(start, stop):
+            return [
+                User(
+                    id=i + 1,
+                    username=f"{names[i % len(names)]}{i + 1}",
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password=password,
+                )
+                for i in range(start, stop)
+            ]
+
+        self.insert(User, count, build)
+        return list(range(1, count + 1))
+
+    def groups(self, count):
+        mixer = Mixer(commit=True)
+        # Групп немного: mixer заполняет их по одной через ORM
+        return [
+            mixer.blend(
+                Group,
+                id=i + 1,
+                slug=f"group-{i + 1}",
+                title=self.fake.catch_phrase()[:200],
+                description=self.fake.paragraph(),
+            ).pk
+            for i in range(count)
+        ]
+
+    def image_pool(self, count):
+        """Несколько настоящих картинок, которые делят посты."""
+        pool = []
+        for _ in range(count):
+            size = (
+                self.rng.randrange(320, 1600),
+                self.rng.randrange(240, 1200),
+            )
+            image = Image.new("RGB", size, self.color())
+            draw = ImageDraw.Draw(image)
+            for _ in range(8):
+                x, y = self.rng.randrange(size[0]), self.rng.randrange(size[1])
+                draw.ellipse(
+                    (x, y, x + size[0] // 4, y + size[1] // 4), self.color()
+                )
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=85)
+            content = ContentFile(buffer.getvalue())
+            name = post_image_storage.save("posts/dataset.jpg", content)
+            pool.append({"image": name, **image_metadata(content)})
+        return pool
+
+    def color(self):
+        return tuple(self.rng.randrange(256) for _ in range(3))
+
+    def posts(self, count, user_ids, group_ids, options):
+        phrases = self.phrases()
+        images = self.image_pool(options["image_pool"]) if count else []
+        span = timedelta(days=options["days"]) / max(count, 1)
+        self.post_dates = (self.now - span * count, span)
+
+        def build(start, stop):
+            posts = []
+            for i in range(start, stop):
+                author = skewed_index(self.rng, len(user_ids), options["skew"])
+                post = Post(
+                    id=i + 1,
+                    author_id=user_ids[scatter(author, len(user_ids))],
+                    text=self.text(phrases, self.rng.randint(1, 6)),
+                    pub_date=self.post_date(i),
+                )
+                if group_ids and self.rng.random() < options["grouped"]:
+                    group = skewed_index(
+                        self.rng, len(group_ids), options["skew"]
+                    )
+                    post.group_id = group_ids[group]
+                if images and self.rng.random() < options["images"]:
+                    for field, value in self.rng.choice(images).items():
+                        setattr(post, field, value)
+                posts.append(post)
+            return posts
+
+        with keep_dates(Post._meta.get_field("pub_date")):
+            self.insert(Post, count, build)
+        return count
+
+    def post_date(self, index):
+        """Посты идут по времени равномерно за --days дней до now."""
+        start, span = self.post_dates
+        return start + span * index
+
+    def follows(self, user_ids, mean, skew):
+        """Подписки: у читателя их число вокруг mean, авторы — «звезды»."""
+        count = len(user_ids)
+
+        def build(start, stop):
+            follows = []
+            for reader in range(start, stop):
+                wanted = min(int(self.rng.expovariate(1 / mean)), count - 1)
+                authors = {
+                    scatter(skewed_index(self.rng, count, skew), count)
+                    for _ in range(wanted)
+                }
+                authors.discard(reader)
+                follows.extend(
+                    Follow(user_id=user_ids[reader], author_id=user_ids[a])
+                    for a in authors
+                )
+            return follows
+
+        if mean > 0 and count > 1:
+            self.insert(Follow, count, build, ignore_conflicts=True)
+
+    def comments(self, count, user_ids, post_count, options):
+        """Комментарии всплесками: горячие посты и часы после публикации."""
+        if not post_count:
+            return
+        phrases = self.phrases()
+
+        def build(start, stop):
+            comments = []
+            for _ in range(start, stop):
+                index = scatter(
+                    skewed_index(self.rng, post_count, options["skew"]),
+                    post_count,
+                )
+                delay = timedelta(minutes=self.rng.expovariate(1 / 90))
+                created = min(self.post_date(index) + delay, self.now)
+                comments.append(
+                    Comment(
+                        post_id=index + 1,
+                        author_id=self.rng.choice(user_ids),
+                        text=self.text(phrases, self.rng.randint(1, 2)),
+                        created=created,
+                    )
+                )
+            return comments
+
+        with keep_dates(Comment._meta.get_field("created")):
+            self.insert(Comment, count, build)
@@ -0,0 +1,142 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .caching import invalidated_timeout
+from .models import Follow, Post
+
+# Поля, которые читает карточка поста в ленте
+CARD_FIELDS = (
+    "id",
+    "text",
+    "pub_date",
+    "image",
+    "image_width",
+    "image_height",
+    "comments_count",
+    "author",
+    "author__username",
+    "author__first_name",
+    "author__last_name",
+    "group",
+    "group__title",
+    "group__slug",
+)
+
+
+def feed_posts(queryset=None, project=True):
+    """Посты для ленты: автор и группа приходят одним JOIN.
+
+    С project=True выбираются только поля, нужные карточке поста.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    queryset = queryset.select_related("author", "group")
+    if project:
+        queryset = queryset.only(*CARD_FIELDS)
+    return queryset
+
+
+def query_follow_posts(user):
+    """Лента подписок соединением Follow и Post на каждый запрос."""
+    return feed_posts(Post.objects.filter(author__following__user=user))
+
+
+def timeline_follow_posts(user):
+    """Лента подписок из заранее разложенной таблицы Timeline."""
+    # Сортировка по колонкам Timeline читает ленту прямо по ее индексу
+    return feed_posts(
+        Post.objects.filter(timeline_entries__user=user).order_by(
+            F("timeline_entries__pub_date").desc(),
+            F("timeline_entries__post").desc(),
+        )
+    )
+
+
+def author_posts_key(author_id):
+    return f"feed:author-posts:{author_id}"
+
+
+class MergedFollowFeed:
+    """Лента подписок слиянием свежих постов каждого автора.
+
+    Для каждого автора в кэше лежат ключи (pub_date, id) его последних
+    постов и их общее число. Страница собирается k-way слиянием этих
+    списков через heapq, а из базы читаются только посты самой страницы.
+    """
+
+    def __init__(self, user):
+        self.author_ids = list(
+            Follow.objects.filter(user=user).values_list(
+                "author_id", flat=True
+            )
+        )
+        self._lists = {}
+
+    def _load(self, author_id, depth):
+        posts = Post.objects.filter(author_id=author_id)
+        keys = list(
+            posts.order_by("-pub_date", "-id").values_list("pub_date", "id")[
+                :depth
+            ]
+        )
+        total = len(keys) if len(keys) < depth else posts.count()
+        return {"keys": keys, "total": total}
+
+    def _author_lists(self, depth):
+        """Списки ключей авторов глубиной не меньше depth."""
+        missing = [
+            author_id
+            for author_id in self.author_ids
+            if author_id not in self._lists
+        ]
+        if missing:
+            cached = cache.get_many([author_posts_key(a) for a in missing])
+            for author_id in missing:
+                self._lists[author_id] = cached.get(
+                    author_posts_key(author_id)
+                )
+        depth = max(depth, settings.FOLLOW_FEED_AUTHOR_DEPTH)
+        for author_id, entry in self._lists.items():
+            if entry is None or (
+                len(entry["keys"]) < min(depth, entry["total"])
+            ):
+                entry = self._load(author_id, depth)
+                cache.set(
+                    author_posts_key(author_id),
+                    entry,
+                    invalidated_timeout(settings.FOLLOW_FEED_CACHE_TIMEOUT),
+                )
+                self._lists[author_id] = entry
+        return [entry["keys"] for entry in self._lists.values()]
+
+    def count(self):
+        self._author_lists(0)
+        return sum(entry["total"] for entry in self._lists.values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        merged = heapq.merge(*self._author_lists(index.stop), reverse=True)
+        ids = [
+            post_id for _, post_id in islice(merged, index.start, index.stop)
+        ]
+        posts = feed_posts().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+FOLLOW_FEED_ENGINES = {
+    "query": query_follow_posts,
+    "timeline": timeline_follow_posts,
+    "merge": MergedFollowFeed,
+}
+
+
+def follow_feed(user):
+    return FOLLOW_FEED_ENGINES[settings.FOLLOW_FEED_ENGINE](user)
@@ -1,5 +1,6 @@
 from django import forms
 
+from .images import set_image_metadata, validate_image_limits
 from .models import Comment, Post
 
 
@@ -12,6 +13,15 @@ class PostForm(forms.ModelForm):
             "image",
         )
 
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        # Новая загрузка уже открыта проверкой ImageField: снимаем сведения
+        if "image" in self.changed_data:
+            if image:
+                validate_image_limits(image)
+            set_image_metadata(self.instance, image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,154 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .caching import bump_versions, post_scopes
+from .models import Post
+from .storage import file_hash, post_image_storage
+
+# Поля Post со сведениями о картинке и их значения без картинки
+METADATA_FIELDS = {
+    "image_width": None,
+    "image_height": None,
+    "image_format": "",
+    "image_bytes": None,
+    "image_hash": "",
+}
+
+# Параметры сохранения при пережатии; прочие форматы — по умолчанию
+SAVE_OPTIONS = {
+    "JPEG": {"quality": 90, "optimize": True, "progressive": True},
+    "PNG": {"optimize": True},
+}
+
+
+def image_metadata(file):
+    """Размеры, формат, объем и хэш картинки.
+
+    У загрузки, уже проверенной forms.ImageField, размеры берутся из
+    открытого при проверке изображения, иначе файл открывается заново.
+    """
+    image = getattr(file, "image", None)
+    if image is None:
+        file.seek(0)
+        image = Image.open(file)
+    width, height = image.size
+    return {
+        "image_width": width,
+        "image_height": height,
+        "image_format": image.format or "",
+        "image_bytes": file.size,
+        "image_hash": file_hash(file),
+    }
+
+
+def set_image_metadata(post, file=None):
+    """Записывает в пост сведения о файле или очищает их."""
+    metadata = image_metadata(file) if file else METADATA_FIELDS
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def validate_image_limits(file):
+    """Проверяет объем и число пикселей загрузки по заголовку файла."""
+    if file.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)s.",
+            code="file_too_large",
+            params={"limit": filesizeformat(settings.POST_IMAGE_MAX_BYTES)},
+        )
+    width, height = file.image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Картинка %(width)s×%(height)s слишком велика.",
+            code="too_many_pixels",
+            params={"width": width, "height": height},
+        )
+
+
+def normalize_image(file, max_side):
+    """Картинка без EXIF и не больше max_side по стороне, либо None.
+
+    None значит, что пережимать нечего. Анимации не трогаем.
+    """
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    if getattr(image, "n_frames", 1) > 1:
+        return None
+    if max(image.size) <= max_side and not image.getexif():
+        return None
+    # JPEG сразу декодируется в уменьшенном масштабе, а не целиком
+    image.draft(None, (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.info.pop("exif", None)
+    image.thumbnail((max_side, max_side))
+    buffer = BytesIO()
+    image.save(
+        buffer, format=image_format, **SAVE_OPTIONS.get(image_format, {})
+    )
+    return ContentFile(buffer.getvalue())
+
+
+def normalize_post_image(post_id):
+    """Пережимает картинку поста и возвращает имя итогового файла.
+
+    Возвращает None, если поста или картинки уже нет или картинку успели
+    заменить, пока шла обработка.
+    """
+    post = (
+        Post.objects.select_related("author", "group")
+        .filter(pk=post_id)
+        .first()
+    )
+    if post is None or not post.image:
+        return None
+    name = post.image.name
+    with post.image.open("rb") as file:
+        content = normalize_image(file, settings.POST_IMAGE_MAX_SIDE)
+    if content is None:
+        return name
+    # Файл и ссылка на него появляются в одной транзакции (см. release_image).
+    # Имя строится от upload_to, а не от старого имени: иначе хранилище
+    # положило бы копию на уровень глубже, и одинаковые результаты
+    # пережатия разных загрузок не сошлись бы в один файл
+    with transaction.atomic():
+        new_name = post.image.storage.save(
+            post.image.field.upload_to, content
+        )
+        updated = Post.objects.filter(pk=post_id, image=name).update(
+            image=new_name, **image_metadata(content)
+        )
+    if not updated:
+        release_image(new_name)
+        return None
+    release_image(name)
+    bump_versions(*post_scopes(post))
+    return new_name
+
+
+def release_image(name):
+    """Удаляет файл и его миниатюры, если на него не ссылается ни один пост.
+
+    Число ссылок — это число постов с таким именем картинки: одинаковые
+    загрузки делят один файл в ContentAddressedStorage. Проверка идет в
+    пишущей транзакции: BEGIN IMMEDIATE дожидается загрузок, которые уже
+    сохранили файл, но еще не закоммитили пост, и они видны проверке.
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        if Post.objects.filter(image=name).exists():
+            return
+        try:
+            delete_with_thumbnails(ImageFile(name, post_image_storage))
+        except SuspiciousFileOperation:
+            # Имя указывает за пределы хранилища: этот файл не наш
+            pass
@@ -0,0 +1,286 @@
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .feeds import author_posts_key
+from .models import Comment, Follow, Group, Post, User
+from .search import DROP_TRIGGERS_SQL, fts_enabled
+from .signals import add_to_timelines, author_entries
+from .utils import bulk_insert
+
+# Строк в одном INSERT, если база позволяет (см. bulk_insert)
+IMPORT_BATCH_SIZE = 1000
+# Строк в одной транзакции: сбой откатывает только эту порцию
+IMPORT_CHUNK_SIZE = 10000
+# Значений в одном IN (...): предел параметров запроса SQLite
+IDS_PER_QUERY = 500
+
+
+def read_rows(file, fmt):
+    """Строки файла NDJSON или CSV словарями, по одной, без буфера.
+
+    Вместо строки NDJSON, которая не разбирается, отдается None:
+    импорт пропускает ее и считает, а не падает посреди файла.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_date(value):
+    """Дата из ISO 8601; без даты — сейчас, без зоны — в зоне проекта."""
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f"Неверная дата: {value}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def optional_id(row, name="id"):
+    value = row.get(name)
+    return int(value) if value not in (None, "") else None
+
+
+def lookup(queryset, field, values):
+    """Словарь значение поля -> id, по IDS_PER_QUERY значений за запрос."""
+    found = {}
+    for part in chunked(values, IDS_PER_QUERY):
+        found.update(
+            queryset.filter(**{f"{field}__in": part}).values_list(field, "id")
+        )
+    return found
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Отключает auto_now_add, чтобы сохранить даты из файла.
+
+    Меняет поля моделей на время импорта: годится для отдельного
+    процесса команды, но не для работающего сервера.
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Загружает строки пачками bulk_create, минуя save() и сигналы.
+
+    Имена пользователей и slug групп разрешаются запросами по
+    IDS_PER_QUERY значений и запоминаются. Производные данные
+    (счетчики, ленты, поиск, миниатюры) не обновляются: их
+    перестраивают отдельным проходом.
+    """
+
+    def __init__(
+        self,
+        create_users=False,
+        batch_size=IMPORT_BATCH_SIZE,
+        chunk_size=IMPORT_CHUNK_SIZE,
+    ):
+        self.create_users = create_users
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.users = {}
+        self.groups = {}
+        self.imported = self.skipped = 0
+        self.author_ids = set()
+
+    def resolve_users(self, usernames):
+        missing = {name for name in usernames if name} - set(self.users)
+        if not missing:
+            return
+        self.users.update(lookup(User.objects, "username", missing))
+        unknown = missing - set(self.users)
+        if unknown and self.create_users:
+            # Перенесенные пользователи входят после сброса пароля
+            password = make_password(None)
+            bulk_insert(
+                User,
+                [User(username=name, password=password) for name in unknown],
+                self.batch_size,
+                ignore_conflicts=True,
+            )
+            self.users.update(lookup(User.objects, "username", unknown))
+
+    def resolve_groups(self, slugs):
+        missing = {slug for slug in slugs if slug} - set(self.groups)
+        if missing:
+            self.groups.update(lookup(Group.objects, "slug", missing))
+
+    def prepare_posts(self, rows):
+        self.resolve_users(row.get("author") for row in rows)
+        self.resolve_groups(row.get("group") for row in rows)
+
+    def build_post(self, row):
+        author_id = self.users.get(row.get("author"))
+        group = row.get("group")
+        group_id = self.groups.get(group) if group else None
+        if author_id is None or (group and group_id is None):
+            return None
+        self.author_ids.add(author_id)
+        return Post(
+            id=optional_id(row),
+            author_id=author_id,
+            group_id=group_id,
+            text=row.get("text", ""),
+            pub_date=parse_date(row.get("pub_date")),
+            image=row.get("image") or "",
+        )
+
+    def prepare_comments(self, rows):
+        self.resolve_users(row.get("author") for row in rows)
+        post_ids = set()
+        for row in rows:
+            try:
+                post_ids.add(optional_id(row, "post"))
+            except (TypeError, ValueError):
+                continue
+        self.post_ids = set(lookup(Post.objects, "id", post_ids - {None}))
+
+    def build_comment(self, row):
+        author_id = self.users.get(row.get("author"))
+        post_id = optional_id(row, "post")
+        if author_id is None or post_id not in self.post_ids:
+            return None
+        return Comment(
+            id=optional_id(row),
+            post_id=post_id,
+            author_id=author_id,
+            text=row.get("text", ""),
+            created=parse_date(row.get("created")),
+        )
+
+    def prepare_follows(self, rows):
+        self.resolve_users(
+            name
+            for row in rows
+            for name in (row.get("user"), row.get("author"))
+        )
+
+    def build_follow(self, row):
+        user_id = self.users.get(row.get("user"))
+        author_id = self.users.get(row.get("author"))
+        if None in (user_id, author_id) or user_id == author_id:
+            return None
+        self.author_ids.add(author_id)
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def build(self, build_one, rows):
+        """Объекты порции; строки с ошибками и без ссылок пропускаются."""
+        objects = []
+        for row in rows:
+            try:
+                obj = build_one(row)
+            except (TypeError, ValueError):
+                obj = None
+            if obj is not None:
+                objects.append(obj)
+        return objects
+
+    def drop_existing(self, model, objects):
+        """Убирает объекты с id, который уже занят в базе или в порции.
+
+        Иначе одна такая строка откатила бы всю порцию ошибкой
+        IntegrityError.
+        """
+        ids = {obj.pk for obj in objects if obj.pk is not None}
+        if not ids:
+            return objects
+        taken = set()
+        for part in chunked(ids, IDS_PER_QUERY):
+            taken.update(
+                model.objects.filter(pk__in=part).values_list("pk", flat=True)
+            )
+        kept = []
+        for obj in objects:
+            if obj.pk is not None:
+                if obj.pk in taken:
+                    continue
+                taken.add(obj.pk)
+            kept.append(obj)
+        return kept
+
+    def run(self, dataset, rows):
+        """Импортирует строки порциями; после каждой отдает итоги."""
+        model, prepare, build_one = {
+            "posts": (Post, self.prepare_posts, self.build_post),
+            "comments": (Comment, self.prepare_comments, self.build_comment),
+            "follows": (Follow, self.prepare_follows, self.build_follow),
+        }[dataset]
+        with keep_dates(
+            Post._meta.get_field("pub_date"),
+            Comment._meta.get_field("created"),
+        ):
+            for chunk in chunked(rows, self.chunk_size):
+                valid = [row for row in chunk if isinstance(row, dict)]
+                with transaction.atomic():
+                    prepare(valid)
+                    objects = self.drop_existing(
+                        model, self.build(build_one, valid)
+                    )
+                    bulk_insert(
+                        model,
+                        objects,
+                        self.batch_size,
+                        # Повторный запуск не дублирует подписки
+                        ignore_conflicts=model is Follow,
+                    )
+                self.imported += len(objects)
+                self.skipped += len(chunk) - len(objects)
+                yield self.imported, self.skipped
+
+
+def pause_search_index():
+    """Снимает триггеры индекса FTS5 на время массовой вставки постов.
+
+    Триггеры обновляли бы индекс на каждую строку. Сама таблица
+    остается, и поиск по уже проиндексированным постам работает;
+    ensure_search_index возвращает триггеры и перестраивает индекс
+    одним проходом.
+    """
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_TRIGGERS_SQL:
+            cursor.execute(statement)
+
+
+def rebuild_timelines(author_ids):
+    """Ленты читателей авторов author_ids и их кэш для ленты-слияния."""
+    for authors in chunked(sorted(author_ids), IDS_PER_QUERY):
+        follows = Follow.objects.filter(author_id__in=authors)
+        for user_id, author_id in follows.values_list(
+            "user_id", "author_id"
+        ).iterator():
+            add_to_timelines(author_entries(user_id, author_id))
+        cache.delete_many([author_posts_key(pk) for pk in authors])
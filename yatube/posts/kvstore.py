@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+MISSING = object()
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище sorl с LRU в памяти процесса перед общим кэшем.
+
+    Записи LRU живут THUMBNAIL_LRU_TIMEOUT секунд: миниатюру могут
+    удалить в другом процессе, и устаревший ответ не должен жить
+    дольше этого срока. Отсутствие записи в LRU не попадает: процесс,
+    который делает миниатюры, сбрасывает версии страниц, и после этого
+    страница не должна собраться из старого промаха и осесть в кэше
+    под новой версией. Промах хранится только в общем кэше, где его
+    перезапишет процесс, сделавший миниатюру, и лишь на тот же срок.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = (
+                time.monotonic() + settings.THUMBNAIL_LRU_TIMEOUT,
+                value,
+            )
+            self._local.move_to_end(key)
+            while len(self._local) > settings.THUMBNAIL_LRU_SIZE:
+                self._local.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            expires, value = self._local.get(key, (0, MISSING))
+            if expires < time.monotonic():
+                self._local.pop(key, None)
+                return MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _get_raw_many(self, keys):
+        """Значения ключей: из LRU, затем одним get_many из кэша и одним
+        запросом к базе для оставшихся."""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._recall(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            cached = self.cache.get_many(missing)
+            absent = [key for key in missing if key not in cached]
+            if absent:
+                rows = dict(
+                    KVStoreModel.objects.filter(key__in=absent).values_list(
+                        "key", "value"
+                    )
+                )
+                self.cache.set_many(
+                    rows, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+                )
+                # Отсутствие живет в общем кэше недолго и через add: оно
+                # не затирает запись, которую успел сделать другой процесс
+                empty = {key: EMPTY_VALUE for key in absent if key not in rows}
+                for key in empty:
+                    self.cache.add(
+                        key, EMPTY_VALUE, settings.THUMBNAIL_LRU_TIMEOUT
+                    )
+                cached.update(rows)
+                cached.update(empty)
+            for key in missing:
+                if cached[key] != EMPTY_VALUE:
+                    self._remember(key, cached[key])
+                found[key] = cached[key]
+        return {
+            key: None if value == EMPTY_VALUE else value
+            for key, value in found.items()
+        }
+
+    def _get_raw(self, key):
+        return self._get_raw_many([key])[key]
+
+    def get_many(self, image_files):
+        """Записи нескольких ImageFile за один проход."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self._get_raw_many(keys)
+        return [
+            deserialize_image_file(values[key]) if values[key] else None
+            for key in keys
+        ]
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._forget(*keys)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.clear_local()
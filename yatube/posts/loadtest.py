@@ -0,0 +1,267 @@
+import logging
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from http.cookies import SimpleCookie
+
+from django.core.signals import got_request_exception
+from django.core.wsgi import get_wsgi_application
+from django.db import OperationalError, connection
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .benchmark import PERCENTILES, percentile
+from .dataset import skewed_index
+from .models import AuthorStats, Group, Post
+
+# Вес каждого действия в смеси по умолчанию: чтения преобладают
+LOAD_MIX = {
+    "index": 30,
+    "group_posts": 10,
+    "profile": 10,
+    "post_detail": 20,
+    "post_comments": 5,
+    "follow_index": 10,
+    "search": 5,
+    "add_comment": 5,
+    "post_create": 2,
+    "follow": 2,
+    "login": 1,
+}
+# Сколько самых популярных постов, авторов и групп служат целями
+LOAD_TARGETS = 1000
+LOAD_SKEW = 2
+OK, ERROR, LOCKED = "ok", "error", "locked"
+
+Targets = namedtuple("Targets", ("post_ids", "usernames", "slugs", "words"))
+Sample = namedtuple("Sample", ("action", "elapsed_ms", "outcome"))
+
+# Исключение последнего запроса своего потока: сигнал приходит в том же
+# потоке, что и запрос, поэтому чужие ошибки сюда не попадают
+_request_error = threading.local()
+
+
+def remember_error(sender, **kwargs):
+    _request_error.value = sys.exc_info()[1]
+
+
+got_request_exception.connect(remember_error, dispatch_uid=__name__)
+
+
+class WSGIClient:
+    """Клиент, который вызывает WSGI-приложение напрямую.
+
+    Тестовый клиент ловит исключения общим для всех потоков сигналом
+    и поднимает их заново; здесь ошибка возвращается ответом 500, как у
+    настоящего сервера, а само исключение — вторым значением. Куки
+    сессии и CSRF клиент хранит сам и подставляет токен CSRF в формы.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.factory = RequestFactory(HTTP_HOST="localhost")
+        self.cookies = self.factory.cookies = SimpleCookie()
+
+    def request(self, method, path, data=None):
+        if method == "post":
+            data = dict(data or {})
+            if "csrftoken" in self.cookies:
+                data["csrfmiddlewaretoken"] = self.cookies["csrftoken"].value
+        environ = getattr(self.factory, method)(path, data or {}).environ
+        response = {}
+        _request_error.value = None
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split()[0])
+            for name, value in headers:
+                if name.lower() == "set-cookie":
+                    self.cookies.load(value)
+
+        body = self.application(environ, start_response)
+        try:
+            for _ in body:
+                pass
+        finally:
+            # close() шлет request_finished: соединения закрываются, как
+            # после запроса к серверу
+            body.close()
+        return response["status"], _request_error.value
+
+    def get(self, path, data=None):
+        return self.request("get", path, data)
+
+    def post(self, path, data=None):
+        return self.request("post", path, data)
+
+    def login(self, username, password):
+        login_url = reverse("users:login")
+        self.get(login_url)
+        status, error = self.post(
+            login_url, {"username": username, "password": password}
+        )
+        # Удачный вход уводит редиректом, а форму с ошибкой отдает
+        # ответом 200: для отчета это отказ
+        return (403 if status == 200 else status), error
+
+
+def load_targets(limit=LOAD_TARGETS):
+    """Самые популярные посты, авторы и группы: горячие цели нагрузки."""
+    posts = Post.objects.order_by("-comments_count", "-pk")[:limit]
+    words = {
+        word
+        for text in posts.values_list("text", flat=True)[:50]
+        for word in text.split()
+        if len(word) > 4 and word.isalpha()
+    }
+    return Targets(
+        list(posts.values_list("pk", flat=True)),
+        list(
+            AuthorStats.objects.order_by("-posts_count", "pk").values_list(
+                "user__username", flat=True
+            )[:limit]
+        ),
+        list(
+            Group.objects.order_by("-posts_count", "pk").values_list(
+                "slug", flat=True
+            )[:limit]
+        ),
+        sorted(words) or ["пост"],
+    )
+
+
+def hot(rng, items):
+    return items[skewed_index(rng, len(items), LOAD_SKEW)]
+
+
+def page(rng):
+    """Номер страницы: чаще первая, иногда поглубже."""
+    return skewed_index(rng, 20, LOAD_SKEW * 2) + 1
+
+
+ACTIONS = {
+    "index": lambda client, rng, targets: client.get(
+        reverse("posts:index"), {"page": page(rng)}
+    ),
+    "group_posts": lambda client, rng, targets: client.get(
+        reverse("posts:group_list", args=[hot(rng, targets.slugs)]),
+        {"page": page(rng)},
+    ),
+    "profile": lambda client, rng, targets: client.get(
+        reverse("posts:profile", args=[hot(rng, targets.usernames)]),
+        {"page": page(rng)},
+    ),
+    "post_detail": lambda client, rng, targets: client.get(
+        reverse("posts:post_detail", args=[hot(rng, targets.post_ids)])
+    ),
+    "post_comments": lambda client, rng, targets: client.get(
+        reverse("posts:post_comments", args=[hot(rng, targets.post_ids)])
+    ),
+    "follow_index": lambda client, rng, targets: client.get(
+        reverse("posts:follow_index"), {"page": page(rng)}
+    ),
+    "search": lambda client, rng, targets: client.get(
+        reverse("posts:search"), {"q": rng.choice(targets.words)}
+    ),
+    "add_comment": lambda client, rng, targets: client.post(
+        reverse("posts:add_comment", args=[hot(rng, targets.post_ids)]),
+        {"text": f"Нагрузочный комментарий {rng.random()}"},
+    ),
+    "post_create": lambda client, rng, targets: client.post(
+        reverse("posts:post_create"),
+        {"text": f"Нагрузочный пост {rng.random()}"},
+    ),
+    "follow": lambda client, rng, targets: client.get(
+        reverse("posts:profile_follow", args=[hot(rng, targets.usernames)])
+    ),
+}
+
+
+def parse_mix(value):
+    """Смесь из строки вида "index=30,add_comment=5"."""
+    mix = {}
+    for item in value.split(","):
+        action, _, weight = item.partition("=")
+        action = action.strip()
+        if action not in LOAD_MIX:
+            raise ValueError(f"Неизвестное действие: {action}")
+        mix[action] = float(weight or 1)
+        if mix[action] < 0:
+            raise ValueError(f"Отрицательный вес: {action}")
+    if not any(mix.values()):
+        raise ValueError("Все веса нулевые")
+    return mix
+
+
+def perform(client, action, rng, targets, password):
+    """Выполняет действие и засекает его; ошибки не прерывают прогон."""
+    started = time.perf_counter()
+    if action == "login":
+        status, error = client.login(hot(rng, targets.usernames), password)
+    else:
+        status, error = ACTIONS[action](client, rng, targets)
+    if isinstance(error, OperationalError) and "locked" in str(error):
+        outcome = LOCKED
+    else:
+        outcome = OK if status < 400 else ERROR
+    elapsed = (time.perf_counter() - started) * 1000
+    return Sample(action, elapsed, outcome)
+
+
+def run_worker(index, options):
+    """Один виртуальный пользователь: входит и шлет запросы по смеси.
+
+    Возвращает замеры всех запросов. Работает и в потоке, и в
+    отдельном процессе: у каждого свое соединение с базой.
+    """
+    # Ошибки считаются в отчете, трассировки на каждую только мешают
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    if options["lock_timeout"] is not None:
+        connection.settings_dict["OPTIONS"]["timeout"] = options[
+            "lock_timeout"
+        ]
+        connection.close()
+    rng = random.Random(options["seed"] + index)
+    targets = load_targets()
+    client = WSGIClient(get_wsgi_application())
+    username = hot(rng, targets.usernames)
+    samples = []
+    try:
+        status, _ = client.login(username, options["password"])
+        if status != 302:
+            raise ValueError(f"Не удалось войти как {username}")
+        actions, weights = zip(*options["mix"].items())
+        deadline = time.monotonic() + options["duration"]
+        while time.monotonic() < deadline and (
+            len(samples) < options["requests"]
+        ):
+            action = rng.choices(actions, weights)[0]
+            samples.append(
+                perform(client, action, rng, targets, options["password"])
+            )
+    finally:
+        connection.close()
+    return samples
+
+
+def summarize(samples, elapsed):
+    """Сводка по действиям: поток, задержки, доли ошибок и блокировок."""
+    by_action = defaultdict(list)
+    for sample in samples:
+        by_action[sample.action].append(sample)
+    by_action["всего"] = list(samples)
+    report = {}
+    for action, items in by_action.items():
+        times = [item.elapsed_ms for item in items]
+        outcomes = [item.outcome for item in items]
+        row = {
+            "requests": len(items),
+            "rps": round(len(items) / elapsed, 1) if elapsed else 0,
+        }
+        for p in PERCENTILES:
+            row[f"p{p}_ms"] = round(percentile(times, p), 1)
+        row["errors"] = round(outcomes.count(ERROR) / len(items), 3)
+        row["locked"] = round(outcomes.count(LOCKED) / len(items), 3)
+        report[action] = row
+    return report
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import EVERYTHING, bump_versions
+from posts.images import image_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Снимает размеры и хэш картинок постов, загруженных раньше."
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").filter(image_hash="")
+        filled = 0
+        for post in posts.only("id", "image").iterator():
+            try:
+                with post.image.open("rb") as file:
+                    metadata = image_metadata(file)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f"Пост {post.id}: {error}")
+                continue
+            Post.objects.filter(pk=post.pk).update(**metadata)
+            filled += 1
+        if filled:
+            # Размеры выводятся в <img>, закэшированные страницы устарели
+            bump_versions(EVERYTHING)
+        self.stdout.write(f"Заполнено постов: {filled}")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Follow, Timeline
+from posts.signals import add_to_timelines, author_entries
+
+
+class Command(BaseCommand):
+    help = "Заполняет таблицу Timeline по существующим подпискам."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            help="Заполнить ленту только этого пользователя (username).",
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by("id")
+        if options["user"]:
+            follows = follows.filter(user__username=options["user"])
+        before = Timeline.objects.count()
+        for user_id, author_id in follows.values_list(
+            "user_id", "author_id"
+        ).iterator():
+            add_to_timelines(author_entries(user_id, author_id))
+        self.stdout.write(
+            f"Добавлено записей ленты: {Timeline.objects.count() - before}"
+        )
@@ -0,0 +1,105 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import (
+    BENCHMARK_REPEAT,
+    BENCHMARK_THRESHOLD,
+    BENCHMARK_VIEWS,
+    compare,
+    dataset_size,
+    read_baseline,
+    run_benchmark,
+    write_baseline,
+)
+
+BASELINE_PATH = os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет время ответа, число и время запросов к базе для лент и "
+        "страницы поста, первых и глубоких страниц, и сравнивает их с "
+        "базовой линией. Набор данных готовит generate_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT)
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=BENCHMARK_THRESHOLD,
+            help="Допустимый рост времени: 0.5 — на 50%%.",
+        )
+        parser.add_argument("--baseline", default=BASELINE_PATH)
+        parser.add_argument(
+            "--view",
+            action="append",
+            choices=BENCHMARK_VIEWS,
+            help="Замерить только эти страницы; по умолчанию все.",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Записать результаты как новую базовую линию.",
+        )
+        parser.add_argument(
+            "--generated-with",
+            default="",
+            help="С --update: как был создан набор данных.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("Нужен хотя бы один повтор.")
+        baseline = None
+        if not options["update"]:
+            baseline = self.load_baseline(options["baseline"])
+        results = run_benchmark(
+            options["repeat"], options["view"], self.stdout.write
+        )
+        if options["update"]:
+            write_baseline(
+                options["baseline"], results, options["generated_with"]
+            )
+            self.stdout.write(f"Базовая линия записана: {options['baseline']}")
+            return
+        regressions = compare(
+            baseline["results"], results, options["threshold"]
+        )
+        if regressions:
+            # Одиночный выброс на общей машине не считается регрессией:
+            # проваленные замеры повторяются, и решает повтор
+            self.stdout.write("Перепроверка: " + ", ".join(regressions))
+            results = run_benchmark(
+                options["repeat"],
+                options["view"],
+                self.stdout.write,
+                only=set(regressions),
+            )
+            regressions = compare(
+                baseline["results"], results, options["threshold"]
+            )
+        if regressions:
+            raise CommandError(
+                "Регрессии относительно базовой линии:\n"
+                + "\n".join(
+                    f"{name}: {'; '.join(problems)}"
+                    for name, problems in regressions.items()
+                )
+            )
+        self.stdout.write(self.style.SUCCESS("Регрессий нет."))
+
+    def load_baseline(self, path):
+        if not os.path.exists(path):
+            raise CommandError(f"Нет базовой линии {path}; запустите --update")
+        baseline = read_baseline(path)
+        # Времена сравнимы только на наборе данных того же размера
+        if baseline["dataset"] != dataset_size():
+            raise CommandError(
+                "Набор данных не совпадает с базовой линией: "
+                f"{baseline['dataset']}; создайте его командой "
+                f"{baseline['generated_with'] or 'generate_dataset'}"
+            )
+        return baseline
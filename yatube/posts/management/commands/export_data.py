@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import (
+    EXPORT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    EXPORTS,
+    export_chunks,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает посты, комментарии или подписки в NDJSON или CSV "
+        "окнами по первичному ключу, не загружая таблицу в память."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORTS))
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="ndjson"
+        )
+        parser.add_argument("--output", help="Файл; по умолчанию stdout.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("Размер окна должен быть положительным.")
+        chunks = export_chunks(
+            options["dataset"], options["format"], options["chunk_size"]
+        )
+        if not options["output"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(
+            options["output"], "w", encoding="utf-8", newline=""
+        ) as file:
+            file.writelines(chunks)
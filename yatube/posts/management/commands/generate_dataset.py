@@ -0,0 +1,115 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.caching import EVERYTHING, bump_versions
+from posts.counters import reconcile
+from posts.dataset import DATASET_BATCH_SIZE, DATASET_NOW, DatasetGenerator
+from posts.importer import pause_search_index, rebuild_timelines
+from posts.models import Group, Post, User
+from posts.search import ensure_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает в пустой базе воспроизводимый по --seed набор "
+        "пользователей, групп, постов, подписок и комментариев для "
+        "нагрузочных проверок."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument(
+            "--follows",
+            type=float,
+            default=10,
+            help="Среднее число подписок у пользователя.",
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=2,
+            help="Перекос популярности авторов, групп и постов; 1 — нет.",
+        )
+        parser.add_argument(
+            "--grouped",
+            type=float,
+            default=0.6,
+            help="Доля постов в группах.",
+        )
+        parser.add_argument(
+            "--images",
+            type=float,
+            default=0.2,
+            help="Доля постов с картинкой.",
+        )
+        parser.add_argument(
+            "--image-pool",
+            type=int,
+            default=20,
+            help="Сколько разных картинок делят посты.",
+        )
+        parser.add_argument(
+            "--days", type=int, default=365, help="За сколько дней посты."
+        )
+        parser.add_argument(
+            "--now",
+            default=DATASET_NOW.isoformat(),
+            help="Дата, к которой привязаны посты, в ISO 8601.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Общий пароль пользователей, чтобы под ними входить.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=DATASET_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Не перестраивать счетчики, ленты и миниатюры.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["skew"] < 1:
+            raise CommandError("Нужен хотя бы один пользователь и skew >= 1.")
+        now = parse_datetime(options["now"])
+        if now is None or timezone.is_naive(now):
+            raise CommandError("--now: нужна дата ISO 8601 с часовым поясом.")
+        generator = DatasetGenerator(
+            options["seed"], options["batch_size"], self.stdout.write, now
+        )
+        try:
+            for model, count in (
+                (User, options["users"]),
+                (Group, options["groups"]),
+                (Post, options["posts"]),
+            ):
+                generator.check_free(model, count)
+        except ValueError as error:
+            raise CommandError(error)
+        user_ids = generator.users(options["users"], options["password"])
+        group_ids = generator.groups(options["groups"])
+        generator.follows(user_ids, options["follows"], options["skew"])
+        # Индекс поиска строится после вставки, а не триггерами на строку
+        pause_search_index()
+        try:
+            posts = generator.posts(
+                options["posts"], user_ids, group_ids, options
+            )
+            generator.comments(options["comments"], user_ids, posts, options)
+        finally:
+            ensure_search_index()
+        if options["skip_derived"]:
+            return
+        for counter, rows in reconcile(User).items():
+            self.stdout.write(f"{counter}: исправлено {rows}")
+        rebuild_timelines(user_ids)
+        call_command("generate_thumbnails", stdout=self.stdout)
+        bump_versions(EVERYTHING)
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from sorl.thumbnail import default
+
+from posts.caching import bump_versions, post_scopes
+from posts.models import Post
+from posts.thumbnails import (
+    THUMBNAIL_PRESETS,
+    generate_thumbnails,
+    thumbnail_file,
+)
+from posts.workers import setup_worker
+
+CHUNK_SIZE = 50
+REPORT_EVERY = 10
+
+
+def thumbnail_chunk(names, presets):
+    """Миниатюры пачки картинок; возвращает число неудач."""
+    return sum(generate_thumbnails(name, presets) for name in names)
+
+
+class Command(BaseCommand):
+    help = (
+        "Готовит миниатюры всех картинок постов в пуле процессов. "
+        "Уже готовые пропускает, поэтому прерванный запуск можно повторить."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--preset",
+            action="append",
+            choices=sorted(THUMBNAIL_PRESETS),
+            help="Размер из THUMBNAIL_PRESETS; по умолчанию все.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Число процессов; 0 — в текущем процессе.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл, где хранится последняя обработанная картинка.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1 or options["workers"] < 0:
+            raise CommandError("Размер пачки и число процессов вне границ.")
+        self.presets = options["preset"] or list(THUMBNAIL_PRESETS)
+        self.checkpoint = options["checkpoint"]
+        chunks = self.pending_chunks(
+            self.read_checkpoint(), options["chunk_size"]
+        )
+        self.started = time.monotonic()
+        self.done = self.skipped = self.failed = self.chunks = 0
+        if options["workers"]:
+            self.run_in_pool(chunks, options["workers"])
+        else:
+            for last, names in chunks:
+                self.finish(last, names, thumbnail_chunk(names, self.presets))
+        self.report()
+
+    def read_checkpoint(self):
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, encoding="utf-8") as file:
+                return file.read().strip()
+        return ""
+
+    def pending_chunks(self, after, chunk_size):
+        """Пачки (последнее имя, имена без готовых миниатюр) по порядку."""
+        names = (
+            Post.objects.exclude(image="")
+            .filter(image__gt=after)
+            .order_by("image")
+            .values_list("image", flat=True)
+            .distinct()
+            .iterator(chunk_size=chunk_size * 10)
+        )
+        while True:
+            chunk = list(islice(names, chunk_size))
+            if not chunk:
+                return
+            pending = self.missing_thumbnails(chunk)
+            self.skipped += len(chunk) - len(pending)
+            yield chunk[-1], pending
+
+    def missing_thumbnails(self, names):
+        files = [
+            thumbnail_file(name, preset)
+            for name in names
+            for preset in self.presets
+        ]
+        found = iter(default.kvstore.get_many(files))
+        step = len(self.presets)
+        return [name for name in names if not all(list(islice(found, step)))]
+
+    def run_in_pool(self, chunks, workers):
+        # spawn: процессы не наследуют открытые соединения с базой
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=setup_worker,
+            initargs=(settings.MEDIA_ROOT, connection.settings_dict["NAME"]),
+        )
+        window = deque()
+        with pool:
+            for last, names in chunks:
+                future = (
+                    pool.submit(thumbnail_chunk, names, self.presets)
+                    if names
+                    else None
+                )
+                window.append((last, names, future))
+                # Пачки завершаются по порядку: контрольная точка не
+                # перескакивает через незаконченную пачку
+                if len(window) >= workers * 2:
+                    self.finish_oldest(window)
+            while window:
+                self.finish_oldest(window)
+
+    def finish_oldest(self, window):
+        last, names, future = window.popleft()
+        self.finish(last, names, future.result() if future else 0)
+
+    def finish(self, last, names, failed):
+        self.expire_pages(names)
+        self.done += len(names)
+        self.failed += failed
+        self.chunks += 1
+        self.save_checkpoint(last)
+        if self.chunks % REPORT_EVERY == 0:
+            self.report()
+
+    def expire_pages(self, names):
+        """Сбрасывает страницы, закэшированные с оригиналами картинок.
+
+        Сбрасывает здесь, а не в пуле: у процессов пула свой LocMemCache,
+        и сброс из них до страниц не дошел бы.
+        """
+        scopes = set()
+        for post in Post.objects.filter(image__in=names).select_related(
+            "author", "group"
+        ):
+            scopes.update(post_scopes(post))
+        bump_versions(*scopes)
+
+    def save_checkpoint(self, name):
+        if self.checkpoint:
+            with open(self.checkpoint, "w", encoding="utf-8") as file:
+                file.write(name)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Обработано картинок: {self.done}, уже готовых: "
+            f"{self.skipped}, ошибок: {self.failed}, {rate:.1f} картинок/с"
+        )
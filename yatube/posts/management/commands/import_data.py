@@ -0,0 +1,94 @@
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.caching import EVERYTHING, bump_versions
+from posts.counters import reconcile
+from posts.importer import (
+    IMPORT_BATCH_SIZE,
+    IMPORT_CHUNK_SIZE,
+    Importer,
+    pause_search_index,
+    read_rows,
+    rebuild_timelines,
+)
+from posts.models import User
+from posts.search import ensure_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает посты, комментарии или подписки из NDJSON или CSV "
+        "пачками bulk_create, а затем перестраивает производные данные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dataset", choices=("posts", "comments", "follows")
+        )
+        parser.add_argument("path", help="Файл; «-» — stdin.")
+        parser.add_argument(
+            "--format", choices=("ndjson", "csv"), default="ndjson"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMPORT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help="Строк в одной транзакции.",
+        )
+        parser.add_argument(
+            "--create-users",
+            action="store_true",
+            help="Заводить неизвестных пользователей без пароля.",
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="Не перестраивать счетчики, ленты и миниатюры.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("Размеры пачки и порции вне границ.")
+        importer = Importer(
+            options["create_users"],
+            options["batch_size"],
+            options["chunk_size"],
+        )
+        dataset = options["dataset"]
+        if dataset == "posts":
+            pause_search_index()
+        try:
+            if options["path"] == "-":
+                self.load(importer, dataset, sys.stdin, options["format"])
+            else:
+                with open(
+                    options["path"], encoding="utf-8", newline=""
+                ) as file:
+                    self.load(importer, dataset, file, options["format"])
+        finally:
+            # Индекс строится одним проходом, даже если импорт прервался
+            if dataset == "posts" and ensure_search_index():
+                self.stdout.write("Индекс поиска перестроен.")
+        if options["skip_derived"]:
+            return
+        self.rebuild(dataset, importer.author_ids)
+
+    def load(self, importer, dataset, file, fmt):
+        for imported, skipped in importer.run(dataset, read_rows(file, fmt)):
+            self.stdout.write(f"Загружено: {imported}, пропущено: {skipped}")
+
+    def rebuild(self, dataset, author_ids):
+        """Отдельный проход по производным данным после загрузки."""
+        for counter, rows in reconcile(User).items():
+            self.stdout.write(f"{counter}: исправлено {rows}")
+        if dataset in ("posts", "follows"):
+            rebuild_timelines(author_ids)
+        if dataset == "posts":
+            call_command("backfill_image_metadata", stdout=self.stdout)
+            call_command("generate_thumbnails", stdout=self.stdout)
+        bump_versions(EVERYTHING)
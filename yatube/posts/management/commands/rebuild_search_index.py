@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.search import FTS_TABLE, fts_enabled
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс постов FTS5."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--optimize",
+            action="store_true",
+            help="После перестройки слить сегменты индекса.",
+        )
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError("Полнотекстовый индекс есть только в SQLite.")
+        commands = ["rebuild"]
+        if options["optimize"]:
+            commands.append("optimize")
+        with connection.cursor() as cursor:
+            for command in commands:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES (%s)",
+                    [command],
+                )
+        self.stdout.write("Индекс поиска перестроен.")
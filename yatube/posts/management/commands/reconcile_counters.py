@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import BATCH_SIZE, reconcile
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счетчики и чинит расхождения."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        fixed = reconcile(User, batch_size=options["batch_size"])
+        for counter, rows in fixed.items():
+            self.stdout.write(f"{counter}: исправлено {rows}")
@@ -0,0 +1,132 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import PERCENTILES
+from posts.loadtest import LOAD_MIX, parse_mix, run_worker, summarize
+
+COLUMNS = (
+    ("requests", "запросов"),
+    ("rps", "в сек"),
+    *((f"p{p}_ms", f"p{p}, мс") for p in PERCENTILES),
+    ("errors", "ошибки"),
+    ("locked", "блокировки"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагружает приложение смесью чтений и записей из пула потоков или "
+        "процессов, вызывая WSGI-приложение напрямую, и выводит поток, "
+        "задержки и доли ошибок и блокировок базы по действиям."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Число виртуальных пользователей; 0 — в текущем потоке.",
+        )
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Пользователи в отдельных процессах, а не в потоках.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30,
+            help="Сколько секунд длится прогон.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            help="Предел запросов на весь прогон.",
+        )
+        parser.add_argument(
+            "--mix",
+            help=(
+                "Веса действий, например index=30,add_comment=5; "
+                f"действия: {', '.join(LOAD_MIX)}."
+            ),
+        )
+        parser.add_argument(
+            "--lock-timeout",
+            type=float,
+            help="Сколько секунд SQLite ждет снятия блокировки записи.",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Пароль пользователей, как у generate_dataset.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options["workers"] < 0 or options["duration"] <= 0:
+            raise CommandError("Число пользователей или время вне границ.")
+        try:
+            mix = parse_mix(options["mix"]) if options["mix"] else LOAD_MIX
+        except ValueError as error:
+            raise CommandError(error)
+        workers = max(options["workers"], 1)
+        total = options["requests"]
+        worker_options = [
+            {
+                "mix": mix,
+                "duration": options["duration"],
+                # Предел делится между пользователями поровну
+                "requests": (
+                    float("inf")
+                    if total is None
+                    else total // workers + (index < total % workers)
+                ),
+                "lock_timeout": options["lock_timeout"],
+                "password": options["password"],
+                "seed": options["seed"],
+            }
+            for index in range(workers)
+        ]
+        started = time.monotonic()
+        try:
+            samples = self.run(options, worker_options)
+        except ValueError as error:
+            raise CommandError(error)
+        self.print_report(summarize(samples, time.monotonic() - started))
+
+    def run(self, options, worker_options):
+        if not options["workers"]:
+            return run_worker(0, worker_options[0])
+        if options["processes"]:
+            # spawn: процессы не наследуют открытые соединения с базой
+            pool = ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        else:
+            pool = ThreadPoolExecutor(
+                max_workers=options["workers"], thread_name_prefix="load"
+            )
+        with pool:
+            futures = [
+                pool.submit(run_worker, index, worker)
+                for index, worker in enumerate(worker_options)
+            ]
+            return [sample for future in futures for sample in future.result()]
+
+    def print_report(self, report):
+        width = max(len(action) for action in report) + 2
+        self.stdout.write(
+            "действие".ljust(width)
+            + "".join(title.rjust(12) for _, title in COLUMNS)
+        )
+        for action, row in report.items():
+            self.stdout.write(
+                action.ljust(width)
+                + "".join(str(row[key]).rjust(12) for key, _ in COLUMNS)
+            )
@@ -0,0 +1,124 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Что и по какой таблице считать: поле счетчика, источник, внешний ключ.
+# Логика заморожена здесь: код приложения меняется вместе со схемой
+AUTHOR_COUNTERS = (
+    ("posts_count", "Post", "author"),
+    ("followers_count", "Follow", "author"),
+    ("following_count", "Follow", "user"),
+    ("comments_count", "Comment", "author"),
+)
+
+
+def count_of(model, fk):
+    """Подзапрос: число строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    posts = {
+        name: apps.get_model("posts", name)
+        for name in ("AuthorStats", "Comment", "Follow", "Group", "Post")
+    }
+    AuthorStats, Post = posts["AuthorStats"], posts["Post"]
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(user_id=pk)
+            for pk in User.objects.values_list("pk", flat=True).iterator()
+        ),
+        batch_size=500,
+    )
+    AuthorStats.objects.update(
+        **{
+            field: count_of(posts[source], fk)
+            for field, source, fk in AUTHOR_COUNTERS
+        }
+    )
+    posts["Group"].objects.update(posts_count=count_of(Post, "group"))
+    Post.objects.update(comments_count=count_of(posts["Comment"], "post"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0004_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="пользователь",
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число постов"
+                    ),
+                ),
+                (
+                    "followers_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число подписчиков"
+                    ),
+                ),
+                (
+                    "following_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число подписок"
+                    ),
+                ),
+                (
+                    "comments_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число комментариев"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Счетчики автора",
+                "verbose_name_plural": "Счетчики авторов",
+            },
+        ),
+        migrations.AddField(
+            model_name="group",
+            name="posts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Число постов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Число комментариев"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
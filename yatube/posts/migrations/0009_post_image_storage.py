@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:10
+
+import posts.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0008_post_image_metadata"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                storage=posts.storage.ContentAddressedStorage(),
+                upload_to="posts/",
+                verbose_name="Картинка",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["image"], name="post_image_idx"),
+        ),
+    ]
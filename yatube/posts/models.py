@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -8,6 +10,9 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name="Название")
     slug = models.SlugField(unique=True, verbose_name="Идентификатор")
     description = models.TextField(verbose_name="Описание")
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Число постов"
+    )
 
     class Meta:
         verbose_name = "Группа"
@@ -37,10 +42,51 @@ class Post(models.Model):
         verbose_name="Группа",
         help_text="Группа, к которой будет относиться пост",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        storage=post_image_storage,
+        blank=True,
+    )
+    # Сведения о картинке снимаются при загрузке, чтобы не читать файл
+    image_width = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name="Ширина картинки"
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name="Высота картинки"
+    )
+    image_format = models.CharField(
+        max_length=10, blank=True, editable=False, verbose_name="Формат"
+    )
+    image_bytes = models.PositiveIntegerField(
+        null=True, blank=True, editable=False, verbose_name="Размер файла"
+    )
+    image_hash = models.CharField(
+        max_length=64, blank=True, editable=False, verbose_name="SHA-256"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Число комментариев"
+    )
 
     class Meta:
-        ordering = ("-pub_date",)
+        ordering = ("-pub_date", "-id")
+        # Индексы повторяют сортировку лент, чтобы страница читалась
+        # проходом по индексу без сортировки во временном B-дереве
+        indexes = [
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="post_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="post_group_pub_date_idx",
+            ),
+            models.Index(
+                fields=["-pub_date", "-id"], name="post_pub_date_idx"
+            ),
+            # Сколько постов ссылается на файл картинки
+            models.Index(fields=["image"], name="post_image_idx"),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
@@ -73,7 +119,14 @@ class Comment(models.Model):
     )
 
     class Meta:
-        ordering = ("-created",)
+        ordering = ("-created", "-id")
+        # Пачки комментариев читаются по курсору (created, id) из индекса
+        indexes = [
+            models.Index(
+                fields=["post", "-created", "-id"],
+                name="comment_post_created_idx",
+            )
+        ]
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -106,3 +159,69 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"{self.user.username}-{self.author.username}"
+
+
+class AuthorStats(models.Model):
+    # Счетчики пользователя, поддерживаемые при записи
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="пользователь",
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число постов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число подписчиков"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число подписок"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, verbose_name="Число комментариев"
+    )
+
+    class Meta:
+        verbose_name = "Счетчики автора"
+        verbose_name_plural = "Счетчики авторов"
+
+    def __str__(self):
+        return f"{self.user_id}"
+
+
+class Timeline(models.Model):
+    # Материализованная лента подписок: строка на пару читатель-пост
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="читатель",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        ordering = ("-pub_date",)
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="timeline_user_pub_date_idx",
+            )
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_entry"
+            )
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Лента подписок"
+
+    def __str__(self):
+        return f"{self.user_id}-{self.post_id}"
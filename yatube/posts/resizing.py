@@ -0,0 +1,151 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageOps
+
+from .storage import post_image_storage
+
+# Формат в адресе -> (формат Pillow, Content-Type, параметры сохранения)
+RESIZE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85, "progressive": True}),
+    "png": ("PNG", "image/png", {"optimize": True}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+}
+SIGNATURE_SALT = "posts.resizing"
+SIGNATURE_LENGTH = 20
+CACHE_BYTES_KEY = "resize-cache:bytes"
+# После вытеснения кэш занимает не больше этой доли предела
+EVICT_TO = 0.9
+
+
+def resize_signature(name, width, height, fmt):
+    value = f"{name}|{width}x{height}|{fmt}"
+    digest = salted_hmac(SIGNATURE_SALT, value).hexdigest()
+    return digest[:SIGNATURE_LENGTH]
+
+
+def valid_signature(signature, name, width, height, fmt):
+    return constant_time_compare(
+        signature, resize_signature(name, width, height, fmt)
+    )
+
+
+def allowed_resize(width, height, fmt):
+    return (width, height) in settings.IMAGE_RESIZE_SIZES and (
+        fmt in RESIZE_FORMATS
+    )
+
+
+def resize_url(name, width, height, fmt="webp"):
+    """Подписанный адрес картинки в размере width×height."""
+    return reverse(
+        "posts:resize_image",
+        kwargs={
+            "signature": resize_signature(name, width, height, fmt),
+            "width": width,
+            "height": height,
+            "fmt": fmt,
+            "name": name,
+        },
+    )
+
+
+def render_resized(name, width, height, fmt):
+    """Картинка, обрезанная по центру до width×height, в формате fmt."""
+    image_format, _, options = RESIZE_FORMATS[fmt]
+    with post_image_storage.open(name, "rb") as file:
+        image = Image.open(file)
+        # JPEG декодируется сразу в масштабе, близком к нужному
+        image.draft("RGB", (width, height))
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+class ResizeCache:
+    """Дисковый кэш уменьшенных картинок с вытеснением давно не читанных.
+
+    Файлы разложены по подкаталогам из первых символов ключа. Чтение
+    обновляет время изменения файла, и вытеснение удаляет самые старые,
+    когда общий объем превышает IMAGE_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or settings.IMAGE_CACHE_ROOT
+        self.max_bytes = max_bytes or settings.IMAGE_CACHE_MAX_BYTES
+
+    @staticmethod
+    def key(name, width, height, fmt):
+        digest = hashlib.sha256(f"{name}|{width}x{height}".encode())
+        return f"{digest.hexdigest()}.{fmt}"
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и переименование: читатель не увидит
+        # недописанный файл, а параллельные записи не испортят друг друга
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        try:
+            total = cache.incr(CACHE_BYTES_KEY, len(data))
+        except ValueError:
+            total = None
+        if total is None or total > self.max_bytes:
+            self.evict()
+        return path
+
+    def files(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def evict(self):
+        """Удаляет самые давние файлы, пока объем не станет ниже предела."""
+        files = sorted(self.files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        cache.set(CACHE_BYTES_KEY, total, None)
+        return total
+
+
+def resized_image(name, width, height, fmt):
+    """Путь к уменьшенной картинке в дисковом кэше; делает ее при промахе."""
+    resize_cache = ResizeCache()
+    key = resize_cache.key(name, width, height, fmt)
+    return resize_cache.get(key) or resize_cache.put(
+        key, render_resized(name, width, height, fmt)
+    )
@@ -0,0 +1,152 @@
+from django.db import connection
+from yatube.settings import POSTS_ON_PAGE
+
+from .feeds import feed_posts
+from .models import Post
+from .utils import (
+    NEXT,
+    PREVIOUS,
+    CursorPage,
+    KeysetPaginator,
+    decode_cursor,
+    encode_cursor,
+)
+
+FTS_TABLE = "posts_post_fts"
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(text, "
+    "content='posts_post', content_rowid='id', tokenize='unicode61')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai "
+    "AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad "
+    "AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+)
+DROP_TRIGGERS_SQL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+)
+DROP_SQL = DROP_TRIGGERS_SQL + (f"DROP TABLE IF EXISTS {FTS_TABLE}",)
+TRIGGERS = tuple(f"{FTS_TABLE}_{suffix}" for suffix in ("ai", "ad", "au"))
+
+
+def fts_enabled(db=connection):
+    return db.vendor == "sqlite"
+
+
+def ensure_search_index(db=connection):
+    """Создает индекс и триггеры, если их нет, и тогда же перестраивает.
+
+    SQLite пересоздает таблицу при изменении схемы Post, и триггеры
+    пропадают вместе со старой таблицей; после миграций их нужно вернуть.
+    """
+    if not fts_enabled(db):
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            (FTS_TABLE, *TRIGGERS),
+        )
+        if len(cursor.fetchall()) == len(TRIGGERS) + 1:
+            return False
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+    return True
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берется в кавычки, так что операторы и скобки из ввода
+    не ломают синтаксис; слова объединяются по И, последнее — по префиксу.
+    """
+    words = ['"{}"'.format(word.replace('"', '""')) for word in query.split()]
+    if not words:
+        return None
+    words[-1] += "*"
+    return " ".join(words)
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset только посты, подходящие под запрос."""
+    # IN (подзапрос) в WHERE: RawSQL в id__in SQLite читает как скаляр
+    return queryset.extra(
+        where=[
+            f"{queryset.model._meta.db_table}.id IN "
+            f"(SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"
+        ],
+        params=[match_expression(query)],
+    )
+
+
+def parse_search_cursor(cursor):
+    """Направление и ключ (rank, id) из курсора; без курсора — начало."""
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is None:
+        return NEXT, None
+    try:
+        return decoded[0], (float(decoded[1][0]), int(decoded[1][1]))
+    except (IndexError, TypeError, ValueError):
+        return NEXT, None
+
+
+def search_page(query, cursor=None, per_page=POSTS_ON_PAGE):
+    """Страница результатов поиска по релевантности (bm25).
+
+    Курсор хранит (rank, id) последнего результата, поэтому следующая
+    страница не пересчитывает предыдущие.
+    """
+    if not fts_enabled():
+        return KeysetPaginator(
+            Post.objects.filter(text__icontains=query), per_page
+        ).get_page(cursor)
+    match = match_expression(query)
+    if match is None:
+        return CursorPage([], None)
+    direction, after = parse_search_cursor(cursor)
+    sql = f"SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [match]
+    forward = direction == NEXT
+    if after is not None:
+        sign = ">" if forward else "<"
+        sql += f" AND (rank {sign} %s OR (rank = %s AND rowid {sign} %s))"
+        params += [after[0], after[0], after[1]]
+    sql += (
+        " ORDER BY rank, rowid"
+        if forward
+        else " ORDER BY rank DESC, rowid DESC"
+    )
+    sql += " LIMIT %s"
+    params.append(per_page + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        hits = db.fetchall()
+    has_more = len(hits) > per_page
+    hits = hits[:per_page]
+    if not forward:
+        hits.reverse()
+    posts = feed_posts().in_bulk([post_id for post_id, _ in hits])
+    page = CursorPage(
+        [posts[post_id] for post_id, _ in hits if post_id in posts], None
+    )
+    if not hits:
+        return page
+    has_next = has_more if forward else True
+    has_previous = after is not None if forward else has_more
+    if has_next:
+        page.next_cursor = encode_cursor(NEXT, list(hits[-1][::-1]))
+    if has_previous:
+        page.previous_cursor = encode_cursor(PREVIOUS, list(hits[0][::-1]))
+    return page
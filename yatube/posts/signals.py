@@ -0,0 +1,219 @@
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models.signals import (
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from .caching import EVERYTHING, bump_versions_on_commit, post_scopes
+from .counters import bump, bump_author, bump_group
+from .feeds import author_posts_key
+from .images import release_image
+from .models import Comment, Follow, Group, Post, Timeline
+from .search import ensure_search_index
+
+TIMELINE_BATCH_SIZE = 1000
+
+
+def add_to_timelines(entries):
+    """Пишет записи ленты пачками, не собирая их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def author_entries(user_id, author_id):
+    """Записи ленты читателя для всех постов одного автора."""
+    return (
+        Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in Post.objects.filter(author_id=author_id)
+        .values_list("id", "pub_date")
+        .iterator()
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not created or raw:
+        return
+    add_to_timelines(
+        Timeline(user_id=user_id, post=instance, pub_date=instance.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=instance.author_id
+        ).values_list("user_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_author_posts(sender, instance, **kwargs):
+    """Сбрасывает кэш последних постов автора для ленты-слияния.
+
+    Как и версии страниц, еще раз после коммита: список, собранный до
+    коммита, не содержит этой записи.
+    """
+    key = author_posts_key(instance.author_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline(sender, instance, created, raw=False, **kwargs):
+    """Добавляет в ленту читателя уже написанные посты автора."""
+    if not created or raw:
+        return
+    add_to_timelines(author_entries(instance.user_id, instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    Timeline.objects.filter(
+        user_id=instance.user_id, post__author_id=instance.author_id
+    ).delete()
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_post(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и картинку поста.
+
+    Группа нужна, чтобы перенести счетчик, картинка — чтобы отпустить
+    файл, если его заменили.
+    """
+    if raw or instance.pk is None:
+        return
+    group_id, group_slug, image = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list("group_id", "group__slug", "image")
+        .first()
+    ) or (None, None, "")
+    instance._saved_group_id = group_id
+    instance._saved_group_slug = group_slug
+    instance._saved_image = image
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        bump_author(instance.author_id, "posts_count", 1)
+        bump_group(instance.group_id, 1)
+        return
+    saved_group_id = getattr(instance, "_saved_group_id", instance.group_id)
+    if saved_group_id != instance.group_id:
+        bump_group(saved_group_id, -1)
+        bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    bump_author(instance.author_id, "posts_count", -1)
+    bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw=False, **kwargs):
+    saved_image = getattr(instance, "_saved_image", "")
+    if not raw and saved_image and saved_image != instance.image.name:
+        transaction.on_commit(lambda: release_image(saved_image))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    if instance.post_id is not None:
+        bump(Post, instance.post_id, "comments_count", 1)
+    bump_author(instance.author_id, "comments_count", 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        bump(Post, instance.post_id, "comments_count", -1)
+    bump_author(instance.author_id, "comments_count", -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    bump_author(instance.author_id, "followers_count", 1)
+    bump_author(instance.user_id, "following_count", 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    bump_author(instance.author_id, "followers_count", -1)
+    bump_author(instance.user_id, "following_count", -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = post_scopes(instance)
+    saved_group_slug = getattr(instance, "_saved_group_slug", None)
+    if saved_group_slug is not None:
+        scopes.append(f"group:{saved_group_slug}")
+    bump_versions_on_commit(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = []
+    if instance.author_id is not None:
+        scopes.append(f"profile:{instance.author.username}")
+    post = (
+        Post.objects.select_related("author", "group")
+        .filter(pk=instance.post_id)
+        .first()
+    )
+    if post is not None:
+        scopes.extend(post_scopes(post))
+    bump_versions_on_commit(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_versions_on_commit(
+        f"profile:{instance.author.username}",
+        f"profile:{instance.user.username}",
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def expire_all_pages(sender, raw=False, **kwargs):
+    # Название группы выводится в карточках всех лент
+    if not raw:
+        bump_versions_on_commit(EVERYTHING)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.name == "posts":
+        ensure_search_index(connections[using])
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+HASH_CHUNK_SIZE = 64 * 1024
+# Расширения привычных форматов; прочие — из списка Pillow
+FORMAT_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+}
+
+
+def file_hash(file):
+    """SHA-256 содержимого файла, читаемого кусками."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def image_extension(file):
+    """Расширение по формату, который распознал Pillow, или пустое.
+
+    Расширение в имени загрузки выбирает клиент, и оно может не
+    совпадать с содержимым.
+    """
+    image = getattr(file, "image", None)
+    if image is None:
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except (OSError, SyntaxError):
+            return ""
+        finally:
+            file.seek(0)
+    if image.format in FORMAT_EXTENSIONS:
+        return FORMAT_EXTENSIONS[image.format]
+    registered = Image.registered_extensions()
+    return min(
+        (
+            extension
+            for extension, image_format in registered.items()
+            if image_format == image.format
+        ),
+        default="",
+    )
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — хэш его содержимого.
+
+    Одинаковые загрузки попадают в один файл: второй раз он не пишется,
+    а миниатюры sorl, привязанные к имени источника, тоже общие.
+    Удалять файл можно, только когда на него не ссылается ни один пост.
+    """
+
+    def save(self, name, content, max_length=None):
+        directory = os.path.dirname(name)
+        digest = file_hash(content)
+        extension = image_extension(content)
+        name = os.path.join(directory, digest[:2], digest + extension)
+        return super().save(name, content, max_length)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._writing = threading.local()
+
+    def get_available_name(self, name, max_length=None):
+        # FileSystemStorage._save спрашивает новое имя, если файл появился
+        # между проверкой и записью; другого имени у этого содержимого нет
+        if getattr(self._writing, "name", None) == name:
+            raise FileExistsError(name)
+        # Имя уже уникально для содержимого: суффиксы не нужны
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        self._writing.name = name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            # Тот же файл успела записать параллельная загрузка
+            return name
+        finally:
+            self._writing.name = None
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,17 @@
+from django import template
+
+from .. import resizing, thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image(post, preset):
+    """Картинка поста: готовая миниатюра или оригинал, без ресайза."""
+    return thumbnails.post_image(post, preset)
+
+
+@register.simple_tag
+def resized_url(image, width, height, fmt="webp"):
+    """Подписанный адрес картинки в одном из IMAGE_RESIZE_SIZES."""
+    return resizing.resize_url(image.name, width, height, fmt)
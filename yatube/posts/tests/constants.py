@@ -1,3 +1,4 @@
+import hashlib
 import tempfile
 from http import HTTPStatus
 
@@ -24,6 +25,7 @@ UNEXISTING_PAGE = "/unexisting_page/"
 OK = HTTPStatus.OK
 REDIRECT = HTTPStatus.FOUND
 NOT_FOUND = HTTPStatus.NOT_FOUND
+NOT_MODIFIED = HTTPStatus.NOT_MODIFIED
 LOGIN = reverse("users:login")
 REDIRECT_POST_CREATE = f"{LOGIN}{NEXT}{POST_CREATE}"
 REDIRECT_LOGIN_FOLLOW = f"{LOGIN}{NEXT}{FOLLOW_USER}"
@@ -49,4 +51,8 @@ TEST_PICTURE_2 = SimpleUploadedFile(
     content_type="image/png",
 )
 IMAGE_FOLDER = Post._meta.get_field("image").upload_to
+# Картинки хранятся под хэшем содержимого
+IMAGE_HASH = hashlib.sha256(IMAGE).hexdigest()
+# Расширение — по формату содержимого (GIF), а не по имени загрузки
+IMAGE_NAME = f"{IMAGE_FOLDER}{IMAGE_HASH[:2]}/{IMAGE_HASH}.gif"
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
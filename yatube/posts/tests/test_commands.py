@@ -0,0 +1,303 @@
+import json
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from ..feeds import timeline_follow_posts
+from ..importer import pause_search_index
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from ..search import ensure_search_index, filter_matching
+
+
+class ImportDataTest(TestCase):
+    """Импорт пачками и перестройка производных данных после него."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="author")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def import_data(self, dataset, content, **options):
+        out = StringIO()
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as file:
+            file.write(content)
+            file.flush()
+            call_command(
+                "import_data", dataset, file.name, stdout=out, **options
+            )
+        return out.getvalue()
+
+    def test_import_posts_rebuilds_derived_data(self):
+        rows = [
+            {
+                "author": "author",
+                "group": "group",
+                "text": f"Импортированный кот {i}",
+                "pub_date": f"2020-01-0{i + 1}T10:00:00",
+            }
+            for i in range(3)
+        ]
+        rows.append({"author": "nobody", "text": "Без автора"})
+        rows.append({"author": "author", "group": "missing", "text": "Нет"})
+        self.import_data(
+            "posts",
+            "\n".join(json.dumps(row) for row in rows),
+            chunk_size=2,
+        )
+        posts = Post.objects.order_by("pub_date")
+        self.assertEqual(posts.count(), 3)
+        self.assertEqual(posts[0].pub_date.year, 2020)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.author.stats.posts_count, 3)
+        self.assertEqual(timeline_follow_posts(self.reader).count(), 3)
+        self.assertEqual(filter_matching(Post.objects, "кот").count(), 3)
+
+    def test_import_skips_bad_lines_and_taken_ids(self):
+        post = Post.objects.create(author=self.author, text="Старый")
+        rows = [
+            {"id": post.pk, "author": "author", "text": "Занятый id"},
+            {"id": post.pk + 1, "author": "author", "text": "Новый"},
+            {"id": post.pk + 1, "author": "author", "text": "Повтор id"},
+        ]
+        lines = ["{не json", "[1, 2]", '"строка"']
+        out = self.import_data(
+            "posts",
+            "\n".join(lines + [json.dumps(row) for row in rows]),
+            chunk_size=4,
+        )
+        self.assertIn("Загружено: 1, пропущено: 5", out)
+        post.refresh_from_db()
+        self.assertEqual(post.text, "Старый")
+        self.assertEqual(Post.objects.get(pk=post.pk + 1).text, "Новый")
+
+    @skipUnless(connection.vendor == "sqlite", "предел переменных SQLite")
+    def test_large_chunk_stays_within_sqlite_variable_limit(self):
+        rows = "\n".join(
+            json.dumps({"user": f"reader{i}", "author": f"author{i}"})
+            for i in range(600)
+        )
+        # Предел старых сборок SQLite: 999 переменных в запросе
+        connection.ensure_connection()
+        limit = sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER
+        previous = connection.connection.setlimit(limit, 999)
+        try:
+            out = self.import_data(
+                "follows",
+                rows,
+                chunk_size=1000,
+                create_users=True,
+                skip_derived=True,
+            )
+        finally:
+            connection.connection.setlimit(limit, previous)
+        self.assertIn("Загружено: 600, пропущено: 0", out)
+
+    def test_search_keeps_working_while_posts_are_imported(self):
+        Post.objects.create(author=self.author, text="Старый кот")
+        pause_search_index()
+        try:
+            Post.objects.create(author=self.author, text="Новый кот")
+            self.assertEqual(filter_matching(Post.objects, "кот").count(), 1)
+        finally:
+            ensure_search_index()
+        self.assertEqual(filter_matching(Post.objects, "кот").count(), 2)
+
+    def test_import_comments_and_follows_from_csv(self):
+        post = Post.objects.create(author=self.author, text="Пост")
+        self.import_data(
+            "comments",
+            "post,author,text\n"
+            f"{post.pk},reader,Первый\n"
+            f"{post.pk + 1},reader,К несуществующему посту\n"
+            f"{post.pk},newcomer,От нового пользователя\n",
+            format="csv",
+            create_users=True,
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.import_data(
+            "follows",
+            "user,author\nnewcomer,author\nnewcomer,author\n"
+            "author,author\n",
+            format="csv",
+        )
+        self.assertEqual(Follow.objects.filter(author=self.author).count(), 2)
+        self.assertEqual(
+            timeline_follow_posts(
+                User.objects.get(username="newcomer")
+            ).count(),
+            1,
+        )
+
+
+class GenerateDatasetTest(TestCase):
+    """Синтетический набор данных воспроизводим по seed."""
+
+    def generate(self, seed, **options):
+        call_command(
+            "generate_dataset",
+            users=30,
+            groups=3,
+            posts=200,
+            comments=300,
+            follows=5,
+            image_pool=0,
+            seed=seed,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def snapshot(self, seed):
+        """Посты набора; база после снимка снова пуста."""
+        with transaction.atomic():
+            self.generate(seed)
+            posts = list(
+                Post.objects.order_by("id").values_list(
+                    "id", "author__username", "text", "pub_date"
+                )
+            )
+            transaction.set_rollback(True)
+        return posts
+
+    def test_same_seed_gives_same_data(self):
+        first = self.snapshot(seed=7)
+        self.assertEqual(self.snapshot(seed=7), first)
+        self.assertNotEqual(self.snapshot(seed=8), first)
+
+    def test_dates_are_anchored_to_now_option(self):
+        self.generate(seed=1, now="2020-06-01T00:00:00+00:00", days=10)
+        newest = Post.objects.latest("pub_date").pub_date
+        self.assertEqual(newest.date().isoformat(), "2020-05-31")
+        with self.assertRaises(CommandError):
+            self.generate(seed=1)
+
+    def test_dataset_is_skewed_and_derived_data_rebuilt(self):
+        self.generate(seed=1)
+        self.assertEqual(Comment.objects.count(), 300)
+        top = AuthorStats.objects.order_by("-posts_count").first()
+        # Самый плодовитый автор пишет заметно больше среднего
+        self.assertGreater(top.posts_count, 200 / 30 * 2)
+        reader = Follow.objects.first().user
+        self.assertEqual(
+            timeline_follow_posts(reader).count(),
+            Post.objects.filter(author__following__user=reader).count(),
+        )
+        word = Post.objects.first().text.split()[0].strip(".")
+        self.assertTrue(filter_matching(Post.objects, word).exists())
+
+
+class BenchmarkViewsTest(TestCase):
+    """Замеры страниц пишут базовую линию и ловят лишние запросы."""
+
+    def setUp(self):
+        call_command(
+            "generate_dataset",
+            users=20,
+            groups=2,
+            posts=60,
+            comments=50,
+            follows=3,
+            image_pool=0,
+            stdout=StringIO(),
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "baseline.json")
+        call_command(
+            "benchmark_views",
+            update=True,
+            baseline=self.path,
+            repeat=2,
+            stdout=StringIO(),
+        )
+
+    def benchmark(self):
+        call_command(
+            "benchmark_views",
+            baseline=self.path,
+            repeat=2,
+            threshold=100,
+            stdout=StringIO(),
+        )
+
+    def test_baseline_covers_views_and_deep_pages(self):
+        with open(self.path, encoding="utf-8") as file:
+            results = json.load(file)["results"]
+        for name in (
+            "index:first:cold",
+            "index:deep-cursor:warm",
+            "group_posts:deep:cold",
+            "profile:deep:cold",
+            "post_detail:first:warm",
+            "follow_index:deep:cold",
+        ):
+            with self.subTest(name=name):
+                self.assertIn(name, results)
+        self.benchmark()
+
+    def test_extra_queries_fail(self):
+        with open(self.path, encoding="utf-8") as file:
+            baseline = json.load(file)
+        baseline["results"]["index:first:cold"]["queries"] -= 1
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, "index:first:cold"):
+            self.benchmark()
+
+
+class ReplayLoadTest(TransactionTestCase):
+    """Нагрузочный прогон входит, пишет и считает итоги по действиям."""
+
+    def setUp(self):
+        call_command(
+            "generate_dataset",
+            users=10,
+            groups=2,
+            posts=30,
+            comments=20,
+            follows=2,
+            image_pool=0,
+            stdout=StringIO(),
+        )
+
+    def replay(self, workers=0, **options):
+        out = StringIO()
+        call_command("replay_load", workers=workers, stdout=out, **options)
+        return {
+            line.split()[0]: line.split()[1:]
+            for line in out.getvalue().splitlines()[1:]
+        }
+
+    def test_mixed_traffic_without_errors(self):
+        report = self.replay(requests=40)
+        requests, *_, errors, locked = report["всего"]
+        self.assertEqual(int(requests), 40)
+        self.assertEqual(float(errors), 0)
+        self.assertEqual(float(locked), 0)
+
+    def test_concurrent_writers_wait_instead_of_failing(self):
+        report = self.replay(
+            workers=4,
+            requests=80,
+            mix="add_comment=3,post_create=1,follow=1,index=2",
+        )
+        requests, *_, errors, locked = report["всего"]
+        self.assertEqual(int(requests), 80)
+        self.assertEqual(float(errors), 0)
+        self.assertEqual(float(locked), 0)
+
+    def test_writes_reach_database(self):
+        comments = Comment.objects.count()
+        report = self.replay(requests=5, mix="add_comment=1")
+        self.assertEqual(list(report), ["add_comment", "всего"])
+        self.assertEqual(Comment.objects.count(), comments + 5)
@@ -1,12 +1,15 @@
 import shutil
 
 from django import forms
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Comment, Group, Post, User
 from .constants import (
-    IMAGE_FOLDER,
+    IMAGE,
+    IMAGE_HASH,
+    IMAGE_NAME,
     LOGIN,
     NEXT,
     POST_CREATE,
@@ -84,9 +87,11 @@ class PostFormTests(TestCase):
         self.assertEqual(post.group.id, form_data["group"])
         self.assertEqual(post.text, form_data["text"])
         self.assertEqual(post.author, self.user)
-        self.assertEqual(
-            post.image.name, f'{IMAGE_FOLDER}{form_data["image"].name}'
-        )
+        self.assertEqual(post.image.name, IMAGE_NAME)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_format, "GIF")
+        self.assertEqual(post.image_bytes, len(IMAGE))
+        self.assertEqual(post.image_hash, IMAGE_HASH)
 
     def test_edit_post(self):
         """Валидная форма редактирует запись в Post."""
@@ -105,9 +110,28 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data["text"])
         self.assertEqual(post.group_id, form_data["group"])
         self.assertEqual(post.author, self.post.author)
-        self.assertEqual(
-            post.image.name, f'{IMAGE_FOLDER}{form_data["image"].name}'
+        self.assertEqual(post.image.name, IMAGE_NAME)
+
+    def test_create_post_rejects_oversized_image(self):
+        """Картинка сверх пределов не проходит, пост не создается."""
+        post_count = Post.objects.count()
+        limits = (
+            {"POST_IMAGE_MAX_BYTES": len(IMAGE) - 1},
+            {"POST_IMAGE_MAX_PIXELS": 1},
         )
+        for limit in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                response = self.authorized_client.post(
+                    POST_CREATE,
+                    data={
+                        "text": "Большая картинка",
+                        "image": SimpleUploadedFile(
+                            "big.gif", IMAGE, content_type="image/gif"
+                        ),
+                    },
+                )
+                self.assertIn("image", response.context["form"].errors)
+                self.assertEqual(Post.objects.count(), post_count)
 
     def test_creat_post_correct_context(self):
         urls = (self.POST_EDIT, POST_CREATE)
@@ -1,6 +1,13 @@
+import sqlite3
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 
-from ..models import User, Group, Post, Comment, Follow
+from ..feeds import feed_posts, timeline_follow_posts
+from ..models import AuthorStats, User, Group, Post, Comment, Follow
 
 
 class PostModelTest(TestCase):
@@ -60,3 +67,113 @@ class GroupModelTest(TestCase):
         """Проверяем, что у моделей корректно работает __str__."""
         group = self.group
         self.assertEqual(str(group), group.title)
+
+
+class CountersTest(TestCase):
+    """Счетчики меняются вместе с данными и чинятся сверкой."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        cls.other_group = Group.objects.create(
+            title="Другая", slug="other", description="Описание"
+        )
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(
+            author=self.user, group=self.group, text="Пост"
+        )
+        Comment.objects.create(post=post, author=self.reader, text="Ок")
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.stats(self.reader).comments_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        follow.delete()
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_group_change_moves_post_counter(self):
+        post = Post.objects.create(
+            author=self.user, group=self.group, text="Пост"
+        )
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+    def test_reconcile_repairs_drift(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f"Пост {i}")
+            for i in range(3)
+        )
+        call_command("reconcile_counters", batch_size=1, stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 3)
+        self.assertEqual(self.stats(self.user).posts_count, 3)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    @skipUnless(connection.vendor == "sqlite", "предел переменных SQLite")
+    def test_reconcile_stays_within_sqlite_variable_limit(self):
+        User.objects.bulk_create(
+            User(username=f"user{i}") for i in range(1000)
+        )
+        # Предел старых сборок SQLite: 999 переменных в запросе
+        connection.ensure_connection()
+        limit = sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER
+        previous = connection.connection.setlimit(limit, 999)
+        try:
+            call_command("reconcile_counters", stdout=StringIO())
+        finally:
+            connection.connection.setlimit(limit, previous)
+        self.assertEqual(AuthorStats.objects.count(), User.objects.count())
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN из SQLite")
+class FeedIndexesTest(TestCase):
+    """Запросы лент читаются по индексам, без сортировки и полного скана."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text="Пост"
+        )
+
+    def test_feed_queries_use_indexes(self):
+        feeds = {
+            "index": feed_posts(),
+            "group": feed_posts(self.group.posts.all()),
+            "profile": feed_posts(self.user.posts.all()),
+            "timeline": timeline_follow_posts(self.user),
+            "comments": self.post.comments.all(),
+        }
+        for name, queryset in feeds.items():
+            with self.subTest(feed=name):
+                plan = queryset[:10].explain()
+                self.assertNotIn("TEMP B-TREE", plan)
+                for line in plan.splitlines():
+                    if " SCAN " in f" {line} ":
+                        self.assertIn("USING", line)
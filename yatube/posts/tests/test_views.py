@@ -1,17 +1,61 @@
+import hashlib
+import os
+import shutil
+import threading
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
 
-from yatube.settings import POSTS_ON_PAGE
+from yatube.settings import COMMENTS_ON_PAGE, POSTS_ON_PAGE
 
-from ..models import Follow, Group, Post, User
+from ..caching import get_versions, invalidated_timeout
+from ..feeds import (
+    MergedFollowFeed,
+    author_posts_key,
+    feed_posts,
+    query_follow_posts,
+)
+from ..images import release_image
+from ..models import Comment, Follow, Group, Post, Timeline, User
+from ..kvstore import KVStore
+from ..resizing import ResizeCache, resize_url
+from ..thumbnails import (
+    cached_thumbnail,
+    post_image,
+    prefetch_post_images,
+    thumbnail_file,
+)
 from .constants import (
     FOLLOW,
+    FOLLOW_USER,
     FOLLOW_USER_2,
     GROUP_LIST,
     GROUP_LIST1,
+    IMAGE,
+    IMAGE_FOLDER,
     INDEX,
+    NOT_FOUND,
+    NOT_MODIFIED,
+    OK,
+    POST_CREATE,
     PROFILE,
+    TEMP_MEDIA_ROOT,
     TEST_PICTURE,
     TEST_SLUG,
     TEST_SLUG1,
@@ -19,6 +63,7 @@ from .constants import (
     TEST_USER_2,
     UNFOLLOW_USER,
 )
+from .utils import run_commit_hooks
 
 
 class PostPagesTests(TestCase):
@@ -49,6 +94,9 @@ class PostPagesTests(TestCase):
         )
         cls.POST_DETAIL = reverse("posts:post_detail", args=[cls.post.id])
 
+    def setUp(self):
+        cache.clear()
+
     def check_post_info(self, post):
         with self.subTest(post=post):
             self.assertEqual(post.text, self.post.text)
@@ -97,14 +145,126 @@ class PostPagesTests(TestCase):
                 self.assertNotIn(self.post, response.context["page_obj"])
 
     def test_cache_index_page(self):
+        """Главная отдается из кэша, пока посты не меняются."""
         response_1 = self.authorized_client.get(INDEX)
-        Post.objects.all().delete()
         response_2 = self.authorized_client.get(INDEX)
         self.assertEqual(response_1.content, response_2.content)
-        cache.clear()
+        # страница из кэша не рендерится заново
+        self.assertIsNone(response_2.context)
+        Post.objects.all().delete()
         response_3 = self.authorized_client.get(INDEX)
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_local_cache_shortens_invalidated_timeout(self):
+        """Сброс с LocMemCache не виден другим процессам: срок короткий."""
+        timeout = settings.PAGE_CACHE_TIMEOUT
+        self.assertEqual(
+            invalidated_timeout(timeout), settings.LOCAL_CACHE_TIMEOUT
+        )
+        dummy = "django.core.cache.backends.dummy.DummyCache"
+        with override_settings(CACHES={"default": {"BACKEND": dummy}}):
+            self.assertEqual(invalidated_timeout(timeout), timeout)
+
+    def test_cached_pages_expire_on_writes(self):
+        """Запись сразу видна на закэшированных страницах."""
+        writes = (
+            (
+                GROUP_LIST,
+                lambda: Post.objects.create(
+                    author=self.user, group=self.group, text="Новый"
+                ),
+            ),
+            (
+                PROFILE,
+                lambda: Follow.objects.filter(
+                    user=self.user_2, author=self.user
+                ).delete(),
+            ),
+        )
+        for url, write in writes:
+            with self.subTest(url=url):
+                # первый запрос выдает CSRF-cookie, от нее зависит ключ
+                self.authorized_client.get(url)
+                before = self.authorized_client.get(url).content
+                self.assertEqual(
+                    self.authorized_client.get(url).content, before
+                )
+                write()
+                self.assertNotEqual(
+                    self.authorized_client.get(url).content, before
+                )
+        # Страница поста несет CSRF-токен формы, ее содержимое меняется на
+        # каждый запрос; проверяется, что общие фрагменты не устарели ни
+        # для гостя, ни для другого пользователя
+        readers = {"guest": self.client, "other": self.authorized_client}
+        for client in readers.values():
+            self.assertNotContains(client.get(self.POST_DETAIL), "Свежий")
+        Comment.objects.create(
+            post=self.post, author=self.user_2, text="Свежий комментарий"
+        )
+        for reader, client in readers.items():
+            with self.subTest(url=self.POST_DETAIL, reader=reader):
+                self.assertContains(
+                    client.get(self.POST_DETAIL), "Свежий комментарий"
+                )
+
+    def test_versions_change_again_after_commit(self):
+        """После коммита записи версии страниц меняются еще раз."""
+        before = get_versions(["index"])
+        Post.objects.create(author=self.user, text="Новый")
+        written = get_versions(["index"])
+        self.assertNotEqual(written, before)
+        run_commit_hooks()
+        self.assertNotEqual(get_versions(["index"]), written)
+
+    def test_post_detail_fragments_are_shared(self):
+        """Общая часть страницы поста рисуется один раз для всех."""
+        self.authorized_client.get(self.POST_DETAIL)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client2.get(self.POST_DETAIL)
+        # сессия и пользователь + автор поста для версий кэша
+        self.assertEqual(len(queries), 3)
+        self.assertNotContains(response, "Редактировать пост")
+        self.assertContains(response, self.post.text)
+        self.assertContains(
+            self.authorized_client.get(self.POST_DETAIL), "Редактировать пост"
+        )
+
+    def test_post_detail_expires_on_comment_and_edit(self):
+        self.client.get(self.POST_DETAIL)
+        self.authorized_client2.post(
+            reverse("posts:add_comment", args=[self.post.id]),
+            {"text": "Новый комментарий"},
+        )
+        self.assertContains(
+            self.client.get(self.POST_DETAIL), "Новый комментарий"
+        )
+        self.authorized_client.post(
+            reverse("posts:post_edit", args=[self.post.id]),
+            {"text": "Исправленный текст", "group": self.group.id},
+        )
+        self.assertContains(
+            self.client.get(self.POST_DETAIL), "Исправленный текст"
+        )
+
+    def test_conditional_get(self):
+        """Неизменившаяся страница отдается как 304 без запросов к базе."""
+        for url in (INDEX, GROUP_LIST, PROFILE, self.POST_DETAIL):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, NOT_MODIFIED)
+                self.assertEqual(response["ETag"], etag)
+                # странице поста нужен лишь автор для версий кэша
+                self.assertEqual(len(queries), int(url == self.POST_DETAIL))
+                Comment.objects.create(
+                    post=self.post, author=self.user_2, text="Комментарий"
+                )
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, OK)
+                self.assertNotEqual(response["ETag"], etag)
+
     def test_follow_page(self):
         Follow.objects.all().delete()
         self.authorized_client.get(FOLLOW_USER_2)
@@ -139,6 +299,8 @@ class PostPagesTests(TestCase):
             )
             for i in range(POSTS_ON_PAGE + 1)
         )
+        # bulk_create не шлет сигналов, ленту подписок заполняем вручную
+        call_command("backfill_timeline", stdout=StringIO())
         test = [
             [INDEX, POSTS_ON_PAGE],
             [GROUP_LIST, POSTS_ON_PAGE],
@@ -153,3 +315,680 @@ class PostPagesTests(TestCase):
             with self.subTest(page=url):
                 response = self.authorized_client2.get(url)
                 self.assertEqual(len(response.context["page_obj"]), value)
+
+    def test_keyset_pagination_walks_feed_both_ways(self):
+        """Курсоры ведут вперед и назад без пропусков и повторов."""
+        Post.objects.all().delete()
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f"Пост {i}")
+            for i in range(POSTS_ON_PAGE + 3)
+        )
+        first = self.authorized_client.get(f"{GROUP_LIST}?cursor=")
+        first_page = first.context["page_obj"]
+        self.assertEqual(len(first_page), POSTS_ON_PAGE)
+        self.assertFalse(first_page.has_previous())
+        second_page = self.authorized_client.get(
+            f"{GROUP_LIST}?cursor={first_page.next_cursor}"
+        ).context["page_obj"]
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back = self.authorized_client.get(
+            f"{GROUP_LIST}?cursor={second_page.previous_cursor}"
+        ).context["page_obj"]
+        self.assertEqual(list(back), list(first_page))
+
+    @override_settings(POSTS_PAGINATION="keyset")
+    def test_keyset_mode_paginates_feeds_by_cursor(self):
+        """В режиме keyset ленты без курсора тоже листаются курсорами."""
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f"Пост {i}")
+            for i in range(POSTS_ON_PAGE)
+        )
+        for url in (INDEX, GROUP_LIST, PROFILE):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                page = response.context["page_obj"]
+                self.assertTrue(page.cursor_mode)
+                self.assertEqual(len(page), POSTS_ON_PAGE)
+                self.assertContains(response, f"cursor={page.next_cursor}")
+                rest = self.authorized_client.get(
+                    url, {"cursor": page.next_cursor}
+                ).context["page_obj"]
+                self.assertFalse(set(page) & set(rest))
+                self.assertFalse(rest.has_next())
+
+    def test_keyset_pagination_ignores_broken_cursor(self):
+        response = self.authorized_client.get(f"{PROFILE}?cursor=garbage")
+        self.assertEqual(len(response.context["page_obj"]), 1)
+
+
+class FeedQueriesTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=TEST_USER)
+        cls.reader = User.objects.create_user(username=TEST_USER_2)
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.group = Group.objects.create(
+            title="Test Group",
+            slug=TEST_SLUG,
+            description="test description of the group",
+        )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.reader_client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        # сессия и пользователь + COUNT и выборка страницы + данные страницы
+        expected = {
+            INDEX: 4,
+            GROUP_LIST: 5,
+            PROFILE: 6,
+            FOLLOW: 4,
+        }
+        Post.objects.create(author=self.user, group=self.group, text="Один")
+        for url, queries in expected.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), queries)
+        Post.objects.bulk_create(
+            Post(author=self.user, group=self.group, text=f"Пост {i}")
+            for i in range(POSTS_ON_PAGE)
+        )
+        call_command("backfill_timeline", stdout=StringIO())
+        for url, queries in expected.items():
+            with self.subTest(url=url, full_page=True):
+                self.assertEqual(self.count_queries(url), queries)
+
+
+class TimelineTests(TestCase):
+    """Лента подписок поддерживается при записи."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_USER)
+        cls.reader = User.objects.create_user(username=TEST_USER_2)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def test_new_post_reaches_followers_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Новый пост")
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=post).exists()
+        )
+        response = self.reader_client.get(FOLLOW)
+        self.assertIn(post, response.context["page_obj"])
+
+    def test_follow_fills_and_unfollow_clears_timeline(self):
+        post = Post.objects.create(author=self.author, text="Старый пост")
+        self.reader_client.get(FOLLOW_USER)
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.reader_client.get(UNFOLLOW_USER)
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    def test_deleted_post_leaves_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text="Удаляемый пост")
+        post.delete()
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    def test_backfill_command(self):
+        Post.objects.create(author=self.author, text="Пост до подписки")
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)]
+        )
+        self.assertFalse(Timeline.objects.exists())
+        call_command("backfill_timeline", stdout=StringIO())
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(), 1)
+
+
+@override_settings(FOLLOW_FEED_ENGINE="merge", FOLLOW_FEED_AUTHOR_DEPTH=3)
+class MergedFollowFeedTests(TestCase):
+    """Лента-слияние совпадает с лентой из JOIN Follow и Post."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username=TEST_USER_2)
+        cls.authors = [
+            User.objects.create_user(username=f"author_{i}") for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(POSTS_ON_PAGE + 5):
+            Post.objects.create(
+                author=cls.authors[i % len(cls.authors)], text=f"Пост {i}"
+            )
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_merge_matches_join(self):
+        expected = list(
+            query_follow_posts(self.reader).order_by("-pub_date", "-id")
+        )
+        feed = MergedFollowFeed(self.reader)
+        self.assertEqual(feed.count(), len(expected))
+        self.assertEqual(feed[0:POSTS_ON_PAGE], expected[:POSTS_ON_PAGE])
+        end = POSTS_ON_PAGE * 2
+        self.assertEqual(feed[POSTS_ON_PAGE:end], expected[POSTS_ON_PAGE:])
+
+    def test_follow_page_uses_merge_and_sees_new_post(self):
+        response = self.reader_client.get(FOLLOW)
+        self.assertEqual(len(response.context["page_obj"]), POSTS_ON_PAGE)
+        post = Post.objects.create(author=self.authors[0], text="Свежий")
+        response = self.reader_client.get(FOLLOW)
+        self.assertEqual(response.context["page_obj"][0], post)
+
+    def test_author_posts_forgotten_again_after_commit(self):
+        author = self.authors[0]
+        Post.objects.create(author=author, text="Свежий")
+        # читатель успел собрать список до коммита записи
+        MergedFollowFeed(self.reader)[0:POSTS_ON_PAGE]
+        self.assertIsNotNone(cache.get(author_posts_key(author.pk)))
+        run_commit_hooks()
+        self.assertIsNone(cache.get(author_posts_key(author.pk)))
+
+    def test_warm_merge_reads_only_page_posts(self):
+        MergedFollowFeed(self.reader)[0:POSTS_ON_PAGE]
+        # подписки + посты страницы одним запросом
+        with self.assertNumQueries(2):
+            MergedFollowFeed(self.reader)[0:POSTS_ON_PAGE]
+
+
+class SearchTests(TestCase):
+    """Поиск идет по индексу FTS5, который следует за постами."""
+
+    SEARCH = reverse("posts:search")
+
+    def setUp(self):
+        self.user = User.objects.create_user(username=TEST_USER)
+        self.cat = Post.objects.create(
+            author=self.user, text="Кот спит. Кот ест. Кот мурлычет."
+        )
+        self.dog = Post.objects.create(
+            author=self.user, text="Собака и кот гуляют вместе."
+        )
+        Post.objects.create(author=self.user, text="Про погоду")
+
+    def search(self, query, cursor=""):
+        response = self.client.get(self.SEARCH, {"q": query, "cursor": cursor})
+        return response.context["page_obj"]
+
+    def test_search_ranks_matches(self):
+        self.assertEqual(list(self.search("кот")), [self.cat, self.dog])
+
+    def test_search_follows_edits_and_deletes(self):
+        self.dog.text = "Собака гуляет одна"
+        self.dog.save()
+        self.assertEqual(list(self.search("собака")), [self.dog])
+        self.assertEqual(list(self.search("кот")), [self.cat])
+        self.cat.delete()
+        self.assertEqual(list(self.search("кот")), [])
+
+    def test_search_handles_query_syntax(self):
+        self.assertEqual(list(self.search('кот" OR (')), [])
+        self.assertEqual(list(self.search("соб")), [self.dog])
+
+    def test_search_cursor_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f"кот номер {i}")
+            for i in range(POSTS_ON_PAGE)
+        )
+        first = self.search("кот")
+        second = self.search("кот", first.next_cursor)
+        self.assertEqual(len(first) + len(second), POSTS_ON_PAGE + 2)
+        self.assertFalse(set(first) & set(second))
+        back = self.search("кот", second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get("/admin/posts/post/", {"q": "кот"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(list(self.search("кот")), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(list(self.search("кот")), [self.cat, self.dog])
+
+
+class CommentPagesTests(TestCase):
+    """Комментарии поста выводятся пачками по курсору."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=TEST_USER)
+        self.post = Post.objects.create(author=self.user, text="Пост")
+        self.detail = reverse("posts:post_detail", args=[self.post.pk])
+        self.more = reverse("posts:post_comments", args=[self.post.pk])
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f"Комментарий {i}")
+            for i in range(count)
+        )
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.detail)
+        return len(queries)
+
+    def test_detail_queries_do_not_grow_with_comments(self):
+        self.add_comments(1)
+        queries = self.count_queries()
+        self.add_comments(COMMENTS_ON_PAGE * 2)
+        self.assertEqual(self.count_queries(), queries)
+
+    def test_comments_load_in_chunks(self):
+        self.add_comments(COMMENTS_ON_PAGE + 5)
+        expected = list(
+            Comment.objects.filter(post=self.post).order_by("-created", "-id")
+        )
+        first = self.client.get(self.detail).context["comments"]
+        self.assertEqual(list(first), expected[:COMMENTS_ON_PAGE])
+        response = self.client.get(self.more, {"cursor": first.next_cursor})
+        rest = response.context["comments"]
+        self.assertEqual(list(rest), expected[COMMENTS_ON_PAGE:])
+        self.assertFalse(rest.has_next())
+        self.assertNotContains(response, "<html")
+        self.assertNotContains(response, "comments-more")
+
+    def test_comments_of_missing_post(self):
+        response = self.client.get(
+            reverse("posts:post_comments", args=[self.post.pk + 1])
+        )
+        self.assertEqual(response.status_code, NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class PostImageTests(TransactionTestCase):
+    """Картинки обрабатываются после загрузки, а не при первом просмотре."""
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear_local()
+        self.user = User.objects.create_user(username=TEST_USER)
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def picture(self):
+        return SimpleUploadedFile("pic.gif", IMAGE, content_type="image/gif")
+
+    def test_page_falls_back_to_original(self):
+        post = Post.objects.create(
+            author=self.user, text="Без миниатюры", image=self.picture()
+        )
+        response = self.client.get(INDEX)
+        self.assertContains(response, f'src="{post.image.url}"')
+        self.assertIsNone(cached_thumbnail(post.image, "card-960-jpeg"))
+
+    def test_fallback_uses_stored_dimensions(self):
+        post = Post.objects.create(
+            author=self.user, text="Старый пост", image=self.picture()
+        )
+        call_command("backfill_image_metadata", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_bytes, len(IMAGE))
+        response = self.client.get(INDEX)
+        self.assertContains(response, 'width="2" height="1"')
+
+    def test_upload_precomputes_thumbnail(self):
+        self.client.post(
+            POST_CREATE, {"text": "С миниатюрой", "image": self.picture()}
+        )
+        post = Post.objects.get()
+        thumbnail = cached_thumbnail(post.image, "card-960-jpeg")
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(list(thumbnail.size), [960, 339])
+        response = self.client.get(INDEX)
+        self.assertContains(response, f'src="{thumbnail.url}"')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_card_offers_srcset_in_webp_and_jpeg(self):
+        self.client.post(
+            POST_CREATE, {"text": "С миниатюрой", "image": self.picture()}
+        )
+        post = Post.objects.get()
+        response = self.client.get(INDEX)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        for preset, width in (
+            ("card-480-jpeg", 480),
+            ("card-720-webp", 720),
+            ("card-960-webp", 960),
+        ):
+            with self.subTest(preset=preset):
+                thumbnail = cached_thumbnail(post.image, preset)
+                self.assertContains(response, f"{thumbnail.url} {width}w")
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_upload_is_reencoded_without_exif(self):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        # Orientation = 6: снимок нужно повернуть на 90°
+        exif[0x0112] = 6
+        Image.new("RGB", (300, 200), "red").save(
+            buffer, "JPEG", exif=exif.tobytes()
+        )
+        upload = SimpleUploadedFile(
+            "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+        )
+        self.client.post(POST_CREATE, {"text": "Фото", "image": upload})
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (67, 100))
+        self.assertEqual(post.image_bytes, post.image.size)
+        with post.image.open("rb") as file, Image.open(file) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertFalse(image.getexif())
+        # Оригинал с EXIF удален, пост ссылается на пережатую копию
+        digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+        original = f"{IMAGE_FOLDER}{digest[:2]}/{digest}.jpg"
+        self.assertNotEqual(post.image.name, original)
+        self.assertFalse(post.image.storage.exists(original))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_same_reencoded_images_share_one_file(self):
+        for text, size in (("Первое", (300, 200)), ("Второе", (450, 300))):
+            buffer = BytesIO()
+            Image.new("RGB", size, "red").save(buffer, "JPEG")
+            upload = SimpleUploadedFile(
+                "photo.jpg", buffer.getvalue(), content_type="image/jpeg"
+            )
+            self.client.post(POST_CREATE, {"text": text, "image": upload})
+        first, second = Post.objects.order_by("id")
+        self.assertEqual(first.image.name, second.image.name)
+        digest = first.image_hash
+        self.assertEqual(
+            first.image.name, f"{IMAGE_FOLDER}{digest[:2]}/{digest}.jpg"
+        )
+        storage = first.image.storage
+        self.assertEqual(
+            storage.listdir(f"{IMAGE_FOLDER}{digest[:2]}"),
+            ([], [f"{digest}.jpg"]),
+        )
+
+    def test_duplicate_uploads_share_file_and_thumbnail(self):
+        for text in ("Первый", "Второй"):
+            self.client.post(
+                POST_CREATE, {"text": text, "image": self.picture()}
+            )
+        first, second = Post.objects.order_by("id")
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        folder = f"{IMAGE_FOLDER}{first.image_hash[:2]}"
+        self.assertEqual(len(storage.listdir(folder)[1]), 1)
+        thumbnail = cached_thumbnail(first.image, "card-960-jpeg")
+        self.assertEqual(
+            cached_thumbnail(second.image, "card-960-jpeg").name,
+            thumbnail.name,
+        )
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        self.assertTrue(thumbnail.exists())
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(thumbnail.exists())
+
+    def test_file_written_after_check_is_reused(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", image=self.picture()
+        )
+        storage = post.image.storage
+        # Файл появился между проверкой exists() и записью
+        with mock.patch.object(storage, "exists", return_value=False):
+            name = storage.save(IMAGE_FOLDER, ContentFile(IMAGE))
+        self.assertEqual(name, post.image.name)
+
+    def test_replaced_image_is_released(self):
+        post = Post.objects.create(
+            author=self.user, text="Пост", image=self.picture()
+        )
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(
+            "other.gif", IMAGE + b"\0", content_type="image/gif"
+        )
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+
+    def test_release_waits_for_uncommitted_upload(self):
+        """Файл не удаляется из-под загрузки, которая еще не закоммичена."""
+        post = Post.objects.create(
+            author=self.user, text="Первый", image=self.picture()
+        )
+        name = post.image.name
+        post.delete()
+        self.assertFalse(post.image.storage.exists(name))
+        uploading = threading.Event()
+
+        def release():
+            uploading.wait()
+            try:
+                release_image(name)
+            finally:
+                connection.close()
+
+        releaser = threading.Thread(target=release)
+        releaser.start()
+        with transaction.atomic():
+            Post.objects.create(
+                author=self.user, text="Второй", image=self.picture()
+            )
+            uploading.set()
+            # освобождение ждет коммита, а не удаляет файл сейчас
+            releaser.join(0.3)
+            self.assertTrue(releaser.is_alive())
+        releaser.join()
+        self.assertTrue(post.image.storage.exists(name))
+
+    def test_page_thumbnails_resolve_in_one_batch(self):
+        for number in range(3):
+            picture = SimpleUploadedFile(
+                f"pic{number}.gif",
+                IMAGE + bytes([number]),
+                content_type="image/gif",
+            )
+            self.client.post(
+                POST_CREATE, {"text": f"Пост {number}", "image": picture}
+            )
+        files = [
+            thumbnail_file(post.image, "card-960-jpeg")
+            for post in Post.objects.all()
+        ]
+        cache.clear()
+        # Холодные LRU и кэш: одна выборка из базы на всю страницу
+        with self.assertNumQueries(1):
+            self.assertTrue(all(KVStore().get_many(files)))
+        # Общий кэш прогрет: другому процессу база уже не нужна
+        store = KVStore()
+        with self.assertNumQueries(0):
+            self.assertTrue(all(store.get_many(files)))
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertTrue(all(store.get_many(files)))
+
+    @override_settings(THUMBNAIL_LRU_TIMEOUT=0)
+    def test_missing_thumbnail_is_not_cached_for_long(self):
+        post = Post.objects.create(
+            author=self.user, text="Без миниатюры", image=self.picture()
+        )
+        files = [thumbnail_file(post.image, "card-960-jpeg")]
+        self.assertEqual(KVStore().get_many(files), [None])
+        # Отсутствие не осело в общем кэше: другой процесс спросит базу
+        with self.assertNumQueries(1):
+            self.assertEqual(KVStore().get_many(files), [None])
+
+    def test_thumbnail_made_elsewhere_is_seen_at_once(self):
+        post = Post.objects.create(
+            author=self.user, text="Без миниатюры", image=self.picture()
+        )
+        files = [thumbnail_file(post.image, "card-960-jpeg")]
+        store = KVStore()
+        self.assertEqual(store.get_many(files), [None])
+        # Миниатюру делает другое хранилище, как другой процесс
+        call_command("generate_thumbnails", workers=0, stdout=StringIO())
+        self.assertIsNot(default.kvstore, store)
+        self.assertIsNotNone(store.get_many(files)[0])
+
+    def test_prefetched_cards_do_not_touch_kvstore(self):
+        self.client.post(
+            POST_CREATE, {"text": "Пост", "image": self.picture()}
+        )
+        posts = list(feed_posts())
+        prefetch_post_images(posts, "card")
+        cache.clear()
+        default.kvstore.clear_local()
+        with self.assertNumQueries(0):
+            image = post_image(posts[0], "card")
+        self.assertEqual((image.width, image.height), (960, 339))
+
+    def test_generate_thumbnails_command_resumes(self):
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text=f"Пост {number}",
+                image=SimpleUploadedFile(
+                    f"pic{number}.gif", IMAGE + bytes([number])
+                ),
+            )
+            for number in range(3)
+        ]
+        checkpoint = f"{TEMP_MEDIA_ROOT}/checkpoint"
+        out = StringIO()
+        call_command(
+            "generate_thumbnails",
+            workers=0,
+            chunk_size=2,
+            checkpoint=checkpoint,
+            stdout=out,
+        )
+        self.assertIn("Обработано картинок: 3", out.getvalue())
+        for post in posts:
+            self.assertIsNotNone(cached_thumbnail(post.image, "card-960-jpeg"))
+        with open(checkpoint) as file:
+            self.assertEqual(file.read(), max(p.image.name for p in posts))
+        out = StringIO()
+        call_command("generate_thumbnails", workers=0, stdout=out)
+        self.assertIn("уже готовых: 3", out.getvalue())
+
+    def test_generate_thumbnails_command_in_process_pool(self):
+        posts = [
+            Post.objects.create(
+                author=self.user,
+                text=f"Пост {number}",
+                image=SimpleUploadedFile(
+                    f"pic{number}.gif", IMAGE + bytes([number])
+                ),
+            )
+            for number in range(3)
+        ]
+        out = StringIO()
+        call_command(
+            "generate_thumbnails",
+            workers=2,
+            chunk_size=1,
+            preset=["card-480-jpeg"],
+            stdout=out,
+        )
+        self.assertIn("Обработано картинок: 3", out.getvalue())
+        self.assertIn("ошибок: 0", out.getvalue())
+        # Родитель успел запомнить, что миниатюр не было
+        cache.clear()
+        default.kvstore.clear_local()
+        for post in posts:
+            thumbnail = cached_thumbnail(post.image, "card-480-jpeg")
+            self.assertTrue(thumbnail.exists())
+
+    def test_generate_thumbnails_command_expires_pages(self):
+        post = Post.objects.create(
+            author=self.user, text="Без миниатюры", image=self.picture()
+        )
+        self.assertContains(self.client.get(INDEX), post.image.url)
+        call_command("generate_thumbnails", workers=0, stdout=StringIO())
+        thumbnail = cached_thumbnail(post.image, "card-960-jpeg")
+        self.assertContains(self.client.get(INDEX), thumbnail.url)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_CACHE_ROOT=os.path.join(TEMP_MEDIA_ROOT, "image_cache"),
+)
+class ResizeImageTests(TestCase):
+    """Картинки по подписанным адресам в разрешенных размерах."""
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=User.objects.create_user(username=TEST_USER),
+            text="Пост",
+            image=SimpleUploadedFile("pic.gif", IMAGE),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_resize_is_served_and_cached(self):
+        url = resize_url(self.post.image.name, 96, 96, "webp")
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        image = Image.open(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual((image.format, image.size), ("WEBP", (96, 96)))
+        cached = ResizeCache().get(
+            ResizeCache.key(self.post.image.name, 96, 96, "webp")
+        )
+        self.assertIsNotNone(cached)
+
+    def test_unsigned_or_unlisted_requests_are_refused(self):
+        name = self.post.image.name
+        signed = resize_url(name, 96, 96, "png")
+        forged = signed.replace("/96x96.", "/320x320.")
+        cases = (
+            (forged, 403),
+            (resize_url(name, 100, 100, "png"), 404),
+            (resize_url(name, 96, 96, "bmp"), 404),
+            (resize_url("posts/missing.gif", 96, 96, "png"), 404),
+        )
+        for url, status in cases:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, status)
+
+    def test_cache_evicts_least_recently_used(self):
+        resize_cache = ResizeCache(max_bytes=25)
+        for number, key in enumerate(("aaaa.png", "bbbb.png", "cccc.png")):
+            path = resize_cache.put(key, b"0" * 10)
+            os.utime(path, (number, number))
+            if key == "bbbb.png":
+                # Чтение делает файл свежим
+                resize_cache.get("aaaa.png")
+        self.assertIsNotNone(resize_cache.get("aaaa.png"))
+        self.assertIsNone(resize_cache.get("bbbb.png"))
+        self.assertIsNotNone(resize_cache.get("cccc.png"))
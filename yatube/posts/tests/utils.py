@@ -0,0 +1,12 @@
+from django.db import connection
+
+
+def run_commit_hooks():
+    """Выполняет колбэки on_commit, отложенные в транзакции теста.
+
+    TestCase не коммитит свою транзакцию, и без этого они не
+    выполнились бы никогда.
+    """
+    hooks, connection.run_on_commit = connection.run_on_commit, []
+    for _, hook in hooks:
+        hook()
@@ -0,0 +1,220 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .caching import bump_versions, post_scopes
+from .images import normalize_post_image
+from .models import Post
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+CARD = {"crop": "center", "upscale": True}
+CARD_JPEG = {**CARD, "format": "JPEG"}
+CARD_WEBP = {**CARD, "format": "WEBP"}
+
+# Размеры миниатюр, которые выводят шаблоны: имя -> (геометрия, опции)
+THUMBNAIL_PRESETS = {
+    "card-480-jpeg": ("480x170", CARD_JPEG),
+    "card-720-jpeg": ("720x254", CARD_JPEG),
+    "card-960-jpeg": ("960x339", CARD_JPEG),
+    "card-480-webp": ("480x170", CARD_WEBP),
+    "card-720-webp": ("720x254", CARD_WEBP),
+    "card-960-webp": ("960x339", CARD_WEBP),
+}
+# Картинки для <picture>: формат -> пресеты по возрастанию ширины.
+# Последний JPEG служит и обычным src для браузеров без srcset.
+PICTURES = {
+    "card": {
+        "jpeg": ("card-480-jpeg", "card-720-jpeg", "card-960-jpeg"),
+        "webp": ("card-480-webp", "card-720-webp", "card-960-webp"),
+    },
+}
+
+PostImage = namedtuple(
+    "PostImage", ("url", "width", "height", "srcset", "webp_srcset")
+)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры, дополненные так же, как это делает sorl.
+
+    От полного набора опций зависит имя файла миниатюры, поэтому без
+    этого шага не найти уже готовую миниатюру.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault("format", backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(image, preset):
+    """ImageFile, под которым sorl хранит миниатюру картинки.
+
+    image — файл из поля Post.image или имя такого файла.
+    """
+    geometry, options = THUMBNAIL_PRESETS[preset]
+    source = ImageFile(image, post_image_storage)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def cached_thumbnail(image, preset):
+    """Готовая миниатюра из хранилища sorl или None; сама не ресайзит."""
+    return default.kvstore.get(thumbnail_file(image, preset))
+
+
+def picture_presets(picture):
+    return [
+        preset for presets in PICTURES[picture].values() for preset in presets
+    ]
+
+
+def srcset(thumbnails):
+    return ", ".join(
+        f"{thumbnail.url} {thumbnail.size[0]}w" for thumbnail in thumbnails
+    )
+
+
+def resolve_post_image(post, picture, thumbnails):
+    """PostImage из готовых миниатюр {пресет: ImageFile или None}."""
+    ready = {
+        fmt: [thumbnails[preset] for preset in presets if thumbnails[preset]]
+        for fmt, presets in PICTURES[picture].items()
+    }
+    if not ready["jpeg"]:
+        return PostImage(
+            post.image.url, post.image_width, post.image_height, "", ""
+        )
+    largest = ready["jpeg"][-1]
+    width, height = largest.size
+    return PostImage(
+        largest.url,
+        width,
+        height,
+        srcset(ready["jpeg"]),
+        srcset(ready["webp"]),
+    )
+
+
+def post_image(post, picture):
+    """Адрес, размеры и srcset картинки поста для <picture>.
+
+    Пока миниатюр нет, отдается оригинал с размерами, сохраненными
+    при загрузке, — ни шаблон, ни этот код не открывают файл.
+    """
+    if not post.image:
+        return None
+    if picture not in getattr(post, "_post_images", {}):
+        prefetch_post_images([post], picture)
+    return post._post_images[picture]
+
+
+def prefetch_post_images(posts, picture):
+    """Разрешает миниатюры всей страницы одним обращением к хранилищу."""
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    presets = picture_presets(picture)
+    files = [
+        thumbnail_file(post.image, preset)
+        for post in posts
+        for preset in presets
+    ]
+    get_many = getattr(default.kvstore, "get_many", None)
+    if get_many is None:
+        found = iter([default.kvstore.get(file) for file in files])
+    else:
+        found = iter(get_many(files))
+    for post in posts:
+        thumbnails = {preset: next(found) for preset in presets}
+        if not hasattr(post, "_post_images"):
+            post._post_images = {}
+        post._post_images[picture] = resolve_post_image(
+            post, picture, thumbnails
+        )
+
+
+def generate_thumbnails(name, presets=None):
+    """Готовит миниатюры картинки в размерах presets (по умолчанию во всех).
+
+    Возвращает число размеров, которые сделать не удалось.
+    """
+    # Ключ миниатюр sorl зависит от хранилища источника, а не только от имени
+    source = ImageFile(name, post_image_storage)
+    failed = 0
+    for preset in presets or THUMBNAIL_PRESETS:
+        geometry, options = THUMBNAIL_PRESETS[preset]
+        try:
+            default.backend.get_thumbnail(source, geometry, **options)
+        except Exception:
+            logger.exception("Не удалось сделать миниатюру %s", name)
+            failed += 1
+    return failed
+
+
+def process_upload(post_id):
+    """Пережимает загруженную картинку поста и готовит ее миниатюры."""
+    name = normalize_post_image(post_id)
+    if not name:
+        return
+    generate_thumbnails(name)
+    # Страницы, закэшированные до готовности миниатюр, показывают оригинал
+    post = (
+        Post.objects.select_related("author", "group")
+        .filter(pk=post_id)
+        .first()
+    )
+    if post is not None:
+        bump_versions(*post_scopes(post))
+
+
+def _run_in_worker(post_id):
+    try:
+        process_upload(post_id)
+    except Exception:
+        logger.exception("Не удалось обработать картинку поста %s", post_id)
+    finally:
+        # У каждого потока свое соединение с базой, закрываем его сами
+        connection.close()
+
+
+def enqueue_upload(post):
+    """Ставит обработку картинки поста в очередь после коммита."""
+    if not post.image:
+        return
+    post_id = post.pk
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run_in_worker, post_id)
+        )
+    else:
+        transaction.on_commit(lambda: process_upload(post_id))
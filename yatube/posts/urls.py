@@ -7,6 +7,7 @@ app_name = "posts"
 urlpatterns = [
     path("", views.index, name="index"),
     path("create/", views.post_create, name="post_create"),
+    path("search/", views.search, name="search"),
     path("group/<slug:slug>/", views.group_posts, name="group_list"),
     path("posts/<int:pk>/edit/", views.post_edit, name="post_edit"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
@@ -14,7 +15,18 @@ urlpatterns = [
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("follow/", views.follow_index, name="follow_index"),
+    path(
+        "images/<str:signature>/<int:width>x<int:height>.<str:fmt>/"
+        "<path:name>",
+        views.resize_image,
+        name="resize_image",
+    ),
     path(
         "profile/<str:username>/follow/",
         views.profile_follow,
@@ -1,8 +1,167 @@
-from django.core.paginator import Paginator
-from yatube.settings import POSTS_ON_PAGE
+import base64
+import binascii
+import json
+from types import SimpleNamespace
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q, QuerySet
+from yatube.settings import COMMENTS_ON_PAGE, POSTS_ON_PAGE
 
-def paginator_posts(post_list, request):
-    return Paginator(post_list, POSTS_ON_PAGE).get_page(
-        request.GET.get("page")
+from .models import Comment
+from .thumbnails import prefetch_post_images
+
+NEXT = "n"
+PREVIOUS = "p"
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачную строку."""
+    payload = json.dumps([direction, values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор; для битого курсора возвращает None."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage(Page):
+    """Страница, которая знает соседей по курсорам, а не по номерам."""
+
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    def __repr__(self):
+        return "<Cursor page of %s objects>" % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу сортировки без COUNT(*) и OFFSET.
+
+    Страница выбирается условием «строго после/до ключа последней записи»,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+
+    def __init__(self, object_list, per_page, key=("pub_date", "id")):
+        super().__init__(object_list, per_page)
+        self.key = key
+
+    def _values(self, obj):
+        if isinstance(obj, dict):
+            # Строка из values(): поля ключа читаются как атрибуты
+            obj = SimpleNamespace(**obj)
+        return [
+            self.object_list.model._meta.get_field(name).value_to_string(obj)
+            for name in self.key
+        ]
+
+    def _parse(self, values):
+        if len(values) != len(self.key):
+            raise ValueError("cursor does not match the key")
+        return [
+            self.object_list.model._meta.get_field(name).to_python(value)
+            for name, value in zip(self.key, values)
+        ]
+
+    def _seek(self, values, lookup):
+        """Лексикографическое сравнение по всем полям ключа."""
+        condition = Q()
+        for position, name in enumerate(self.key):
+            step = Q(**{f"{name}__{lookup}": values[position]})
+            for prefix, value in zip(self.key[:position], values):
+                step &= Q(**{prefix: value})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        decoded = decode_cursor(cursor) if cursor else None
+        direction, values = decoded or (NEXT, None)
+        if values is not None:
+            try:
+                values = self._parse(values)
+            except (ValidationError, ValueError, TypeError):
+                direction, values = NEXT, None
+        descending = [f"-{name}" for name in self.key]
+        if direction == NEXT:
+            queryset = self.object_list.order_by(*descending)
+            if values is not None:
+                queryset = queryset.filter(self._seek(values, "lt"))
+        else:
+            queryset = self.object_list.order_by(*self.key).filter(
+                self._seek(values, "gt")
+            )
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self)
+        has_next = has_more if direction == NEXT else True
+        has_previous = values is not None if direction == NEXT else has_more
+        page = CursorPage(rows, self)
+        if has_next:
+            page.next_cursor = encode_cursor(NEXT, self._values(rows[-1]))
+        if has_previous:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, self._values(rows[0])
+            )
+        return page
+
+
+def bulk_insert(model, objects, batch_size, **options):
+    """bulk_create пачками не больше предела базы на один запрос.
+
+    Django 2.2 не сверяет заданный batch_size с лимитом SQLite на число
+    переменных в запросе, поэтому пачка ограничивается здесь.
+    """
+    limit = connection.ops.bulk_batch_size(
+        model._meta.concrete_fields, objects
+    )
+    model.objects.bulk_create(
+        objects, batch_size=max(min(batch_size, limit), 1), **options
     )
+
+
+def paginator_posts(post_list, request):
+    cursor = request.GET.get("cursor")
+    # Курсоры работают только поверх QuerySet; прочие ленты — по номерам
+    if isinstance(post_list, QuerySet) and (
+        settings.POSTS_PAGINATION == "keyset" or cursor is not None
+    ):
+        page = KeysetPaginator(post_list, POSTS_ON_PAGE).get_page(cursor)
+    else:
+        page = Paginator(post_list, POSTS_ON_PAGE).get_page(
+            request.GET.get("page")
+        )
+    # Миниатюры карточек разрешаются для всей страницы разом
+    prefetch_post_images(page, "card")
+    return page
+
+
+def comments_page(post_id, cursor=None):
+    """Пачка комментариев поста вместе с авторами, от новых к старым."""
+    comments = Comment.objects.filter(post_id=post_id).select_related("author")
+    return KeysetPaginator(
+        comments, COMMENTS_ON_PAGE, key=("created", "id")
+    ).get_page(cursor)
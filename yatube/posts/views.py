@@ -1,26 +1,50 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_safe
+
+from .caching import (
+    invalidated_timeout,
+    not_modified,
+    page_etag,
+    post_detail_scopes,
+    scopes_version,
+    versioned_cache_page,
+    versioned_value,
+)
+from .feeds import feed_posts, follow_feed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
-from .utils import paginator_posts
-
-
-@cache_page(20)
+from .resizing import (
+    RESIZE_FORMATS,
+    allowed_resize,
+    resized_image,
+    valid_signature,
+)
+from .search import search_page
+from .thumbnails import enqueue_upload, prefetch_post_images
+from .utils import comments_page, paginator_posts
+
+
+@versioned_cache_page("index")
 def index(request):
     template = "posts/index.html"
-    posts = Post.objects.all()
+    posts = feed_posts()
     context = {
         "page_obj": paginator_posts(posts, request),
     }
     return render(request, template, context)
 
 
+@versioned_cache_page("group:{slug}")
 def group_posts(request, slug):
     template = "posts/group_list.html"
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = feed_posts(group.posts.all())
     context = {
         "group": group,
         "page_obj": paginator_posts(posts, request),
@@ -28,11 +52,14 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@versioned_cache_page("profile:{username}")
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related("stats"), username=username
+    )
     context = {
         "author": author,
-        "page_obj": paginator_posts(author.posts.all(), request),
+        "page_obj": paginator_posts(feed_posts(author.posts.all()), request),
         "following": request.user.is_authenticated
         and request.user != author
         and Follow.objects.filter(author=author, user=request.user).exists(),
@@ -41,16 +68,63 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    template = "posts/post_detail.html"
-    post = get_object_or_404(Post, id=post_id)
+    """Страница поста: общая для всех часть берется из кэша.
+
+    Пост и фрагменты шаблона кэшируются по версиям областей поста и его
+    автора, а ссылка на правку и форма комментария рисуются для каждого
+    пользователя отдельно.
+    """
+    version = scopes_version(post_detail_scopes(post_id))
+    etag = page_etag(request, [version])
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    post = versioned_value(
+        f"post:{post_id}",
+        version,
+        lambda: get_object_or_404(
+            feed_posts().select_related("author__stats"), id=post_id
+        ),
+    )
     context = {
         "post": post,
         "form": CommentForm(),
+        # Комментарии читаются, только если фрагмент не нашелся в кэше
+        "comments": SimpleLazyObject(lambda: comments_page(post_id)),
+        "fragment_version": version,
+        "fragment_timeout": invalidated_timeout(settings.PAGE_CACHE_TIMEOUT),
     }
-    return render(request, template, context)
+    response = render(request, "posts/post_detail.html", context)
+    response["ETag"] = etag
+    return response
+
+
+@versioned_cache_page("post:{post_id}")
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для подгрузки на странице поста."""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        "post_id": post_id,
+        "comments": comments_page(post_id, request.GET.get("cursor")),
+    }
+    return render(request, "posts/include/comment_list.html", context)
+
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = search_page(query, request.GET.get("cursor")) if query else None
+    if page is not None:
+        prefetch_post_images(page, "card")
+    context = {
+        "query": query,
+        "page_obj": page,
+    }
+    return render(request, "posts/search.html", context)
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -58,10 +132,12 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    enqueue_upload(post)
     return redirect("posts:profile", username=post.author)
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, pk):
     template = "posts/create_post.html"
     post = get_object_or_404(Post, pk=pk)
@@ -72,12 +148,15 @@ def post_edit(request, pk):
     )
     if form.is_valid():
         post.save()
+        if "image" in form.changed_data:
+            enqueue_upload(post)
         return redirect("posts:post_detail", post_id=pk)
     context = {"form": form, "is_edit": True}
     return render(request, template, context)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -92,14 +171,13 @@ def add_comment(request, post_id):
 def follow_index(request):
     tempalate = "posts/follow.html"
     context = {
-        "page_obj": paginator_posts(
-            Post.objects.filter(author__following__user=request.user), request
-        ),
+        "page_obj": paginator_posts(follow_feed(request.user), request),
     }
     return render(request, tempalate, context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     follow_author = get_object_or_404(User, username=username)
     if follow_author != request.user and (
@@ -110,8 +188,26 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     get_object_or_404(
         Follow, author__username=username, user=request.user
     ).delete()
     return redirect("posts:profile", username=username)
+
+
+@require_safe
+def resize_image(request, signature, width, height, fmt, name):
+    if not allowed_resize(width, height, fmt):
+        raise Http404("Такого размера или формата нет.")
+    if not valid_signature(signature, name, width, height, fmt):
+        raise PermissionDenied
+    try:
+        file = open(resized_image(name, width, height, fmt), "rb")
+    except OSError:
+        # Исходника нет, это не картинка или файл только что вытеснен
+        raise Http404("Картинка не найдена.")
+    response = FileResponse(file, content_type=RESIZE_FORMATS[fmt][1])
+    # Адрес подписан и зависит от содержимого исходника: ответ неизменен
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
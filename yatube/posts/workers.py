@@ -0,0 +1,16 @@
+import django
+from django.conf import settings
+
+# Модуль не импортирует моделей: процесс пула загружает его до
+# django.setup(), чтобы вызвать setup_worker
+
+
+def setup_worker(media_root, database_name):
+    """Поднимает Django в процессе пула с файлами и базой родителя.
+
+    spawn читает модуль настроек заново, и без этого процесс не увидел
+    бы настроек, измененных в родителе (например, в тестах).
+    """
+    django.setup()
+    settings.MEDIA_ROOT = media_root
+    settings.DATABASES["default"]["NAME"] = database_name
@@ -0,0 +1,19 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, в котором транзакция сразу берет блокировку записи.
+
+    Обычный BEGIN берет ее только на первой записи. Если к этому
+    времени пишет другое соединение, SQLite не ждет его, а сразу
+    отвечает "database is locked", иначе они заблокировали бы друг
+    друга. BEGIN IMMEDIATE ждет очереди в пределах timeout.
+
+    Очередь касается каждого блока atomic, в том числе только
+    читающих: GET формы в админке, get_or_create, который нашел
+    строку. Они ждут пишущих вместо того, чтобы читать параллельно;
+    запросы вне транзакций не затронуты.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
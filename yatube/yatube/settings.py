@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "users.apps.UsersConfig",
     "about.apps.AboutConfig",
+    "api.apps.ApiConfig",
     "sorl.thumbnail",
 ]
 
@@ -88,8 +89,13 @@ WSGI_APPLICATION = "yatube.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        # sqlite3 с BEGIN IMMEDIATE: пишущие запросы ждут друг друга,
+        # а не падают с "database is locked"
+        "ENGINE": "yatube.db",
         "NAME": os.path.join(BASE_DIR, "db.sqlite3"),
+        # Тестовая база в файле: у базы в памяти общий кэш с табличными
+        # блокировками, и параллельные запросы в тестах не похожи на жизнь
+        "TEST": {"NAME": os.path.join(BASE_DIR, "test_db.sqlite3")},
     }
 }
 
@@ -140,6 +146,45 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 POSTS_ON_PAGE = 10
+# "offset" — номера страниц, "keyset" — курсоры по (pub_date, id)
+POSTS_PAGINATION = "offset"
+# Комментарии выводятся пачками по курсору (created, id)
+COMMENTS_ON_PAGE = 20
+# JSON API: наибольший размер страницы (?limit=) и пачки постов (?ids=)
+API_MAX_PAGE_SIZE = 100
+API_BATCH_SIZE = 100
+# Источник ленты подписок: "timeline", "merge" или "query"
+FOLLOW_FEED_ENGINE = "timeline"
+# Для "merge": сколько последних постов автора держать в кэше и как долго
+FOLLOW_FEED_AUTHOR_DEPTH = 50
+FOLLOW_FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Страницы лент сбрасываются сигналами записи, срок — лишь страховка.
+# Сброс виден только процессам с общим кэшем (Memcached, Redis): с
+# LocMemCache по умолчанию у каждого процесса свой кэш, и все, что
+# сбрасывают сигналы, живет не дольше LOCAL_CACHE_TIMEOUT
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+LOCAL_CACHE_TIMEOUT = 20
+# Потоки, которые готовят миниатюры после загрузки; 0 — сразу после коммита
+THUMBNAIL_WORKERS = 2
+# Записи sorl держатся в памяти процесса перед общим кэшем и базой
+THUMBNAIL_KVSTORE = "posts.kvstore.KVStore"
+THUMBNAIL_LRU_SIZE = 1000
+THUMBNAIL_LRU_TIMEOUT = 60
+# Размеры, в которых можно запросить картинку по подписанному адресу
+IMAGE_RESIZE_SIZES = (
+    (96, 96),
+    (320, 320),
+    (640, 360),
+    (960, 339),
+    (1280, 720),
+)
+# Дисковый кэш уменьшенных картинок и его предельный объем
+IMAGE_CACHE_ROOT = os.path.join(BASE_DIR, "image_cache")
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Пределы загружаемой картинки и сторона, до которой она пережимается
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 2560
 CSRF_FAILURE_VIEW = "core.views.csrf_failure"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")